@@ -18,7 +18,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'recipes.pagination.LimitPagination',
     'PAGE_SIZE': 6,
@@ -89,6 +89,22 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.redis.RedisCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='redis://redis:6379'),
+    }
+}
+
+AUTH_TOKEN_CACHE = {
+    'SIZE': int(os.getenv('AUTH_TOKEN_CACHE_SIZE', default=10000)),
+    'TIMEOUT': int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=300)),
+    'SHARED': os.getenv('AUTH_TOKEN_CACHE_SHARED', default='') == 'true',
+}
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import (
+    AuthorCounters,
     Recipe,
     Subscribe,
     Tag,
@@ -21,16 +22,24 @@ class RecipeAdmin(admin.ModelAdmin):
         'author', 'name',
         'text', 'cooking_time', 'image',
     )
-    read_only_fields = (
-        'favorite_count',
+    readonly_fields = (
+        'favorites_count', 'cart_count',
     )
     search_fields = ('author__username', 'name', 'tags__slug',)
     empty_value_display = '-пусто-'
 
     def favorite_count(self, obj):
-        return FavoriteRecipes.objects.filter(recipe=obj).count()
+        return obj.favorites_count
     favorite_count.short_description = 'Добавлено в избранное'
 
+    def save_model(self, request, obj, form, change):
+        if change and 'image' not in form.changed_data:
+            obj.save(update_fields=obj.get_update_fields(
+                exclude=Recipe.IMAGE_FIELDS
+            ))
+        else:
+            super().save_model(request, obj, form, change)
+
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = (
@@ -87,6 +96,14 @@ class FavoriteRecipesAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class AuthorCountersAdmin(admin.ModelAdmin):
+    list_display = (
+        'user', 'recipes_count', 'followers_count',
+    )
+    search_fields = ('user__username',)
+    empty_value_display = '-пусто-'
+
+
 class RecipeingredientsAdmin(admin.ModelAdmin):
     list_display = (
         'pk', 'recipe', 'ingredient', 'amount',
@@ -105,3 +122,4 @@ admin.site.register(FavoriteRecipes, FavoriteRecipesAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(RecipeIngredients, RecipeingredientsAdmin)
+admin.site.register(AuthorCounters, AuthorCountersAdmin)
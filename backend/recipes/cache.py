@@ -0,0 +1,99 @@
+"""
+Поколения (версии) данных в общем кэше.
+Ключи кэшированных данных включают номер поколения,
+поэтому увеличение поколения делает устаревшими все такие ключи
+сразу во всех процессах, если кэш общий (Redis).
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+RECIPES = 'recipes'
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+TRENDING = 'trending'
+# Счетчики избранного: порядок списка рецептов по популярности.
+FAVORITES = 'favorites'
+# Данные пользователей, выводимые как авторы рецептов.
+USERS = 'users'
+RECIPE_INGREDIENTS = 'recipe_ingredients'
+DELETED_RECIPES = 'deleted_recipes'
+
+GENERATION_KEY = 'generation:{}'
+METRIC_KEY = 'metrics:{}:{}'
+
+
+def recipe_generation(pk):
+    """Имя поколения данных отдельного рецепта."""
+    return f'recipe:{pk}'
+
+
+def user_generation(pk):
+    """
+    Имя поколения данных, зависящих от пользователя:
+    избранного, списка покупок и подписок.
+    """
+    return f'user:{pk}'
+
+
+def get_generations(names):
+    """Текущие поколения данных names одним обращением к кэшу."""
+    keys = {GENERATION_KEY.format(name): name for name in names}
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        # Начальное значение не повторяет поколения, вытесненные из кэша.
+        initial = time.time_ns()
+        for key in missing:
+            cache.add(key, initial, None)
+        values.update(cache.get_many(missing))
+    return {keys[key]: value for key, value in values.items()}
+
+
+def get_generation(name):
+    """Текущее поколение данных name."""
+    return get_generations([name])[name]
+
+
+def peek_generation(name):
+    """
+    Текущее поколение данных name без создания ключа в кэше:
+    отсутствующее поколение считается нулевым.
+    """
+    return cache.get(GENERATION_KEY.format(name), 0)
+
+
+def bump_generation(name, timeout=None):
+    """
+    Увеличивает поколение данных name после фиксации транзакции.
+    timeout задает время жизни ключа, если он создается заново.
+    """
+    transaction.on_commit(lambda: _bump_generation(name, timeout))
+
+
+def _bump_generation(name, timeout=None):
+    key = GENERATION_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout)
+
+
+def record_metric(name, metric):
+    """Увеличивает счетчик metric (например, hit/miss) кэша name."""
+    key = METRIC_KEY.format(name, metric)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_metrics(name, *metrics):
+    """Значения счетчиков кэша name."""
+    values = cache.get_many([METRIC_KEY.format(name, m) for m in metrics])
+    return {
+        metric: values.get(METRIC_KEY.format(name, metric), 0)
+        for metric in metrics
+    }
@@ -0,0 +1,49 @@
+"""
+Пересчет денормализованных счетчиков рецептов и авторов.
+"""
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    """Подзапрос количества строк model, ссылающихся на внешнюю запись."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                count=Count('pk')
+            ).values('count'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def recount(recipe_model, favorite_model, shopping_list_model,
+            subscribe_model, counters_model, user_model):
+    """
+    Пересчитывает все счетчики одним UPDATE на таблицу.
+    Модели передаются явно, чтобы функцию можно было
+    использовать и в миграциях.
+    """
+    with transaction.atomic():
+        recipes = recipe_model.objects.update(
+            favorites_count=count_subquery(favorite_model, 'recipe'),
+            cart_count=count_subquery(shopping_list_model, 'recipe'),
+        )
+        counters_model.objects.bulk_create(
+            [
+                counters_model(user_id=pk)
+                for pk in user_model.objects.filter(
+                    counters__isnull=True
+                ).values_list('pk', flat=True)
+            ],
+            ignore_conflicts=True
+        )
+        authors = counters_model.objects.update(
+            recipes_count=count_subquery(recipe_model, 'author'),
+            followers_count=count_subquery(subscribe_model, 'subscribed'),
+        )
+    return recipes, authors
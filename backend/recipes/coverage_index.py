@@ -0,0 +1,122 @@
+"""
+Обратный индекс ингредиент - рецепты в памяти процесса.
+Используется для подбора рецептов по имеющимся у пользователя
+ингредиентам без соединения таблиц в базе данных.
+"""
+import heapq
+from collections import Counter, defaultdict
+from datetime import timedelta
+from threading import Lock
+
+from django.utils import timezone
+
+from .cache import (
+    DELETED_RECIPES,
+    RECIPE_INGREDIENTS,
+    bump_generation,
+    get_generations
+)
+from .models import Recipe, RecipeIngredients
+
+# Запас по времени для транзакций, зафиксированных позже,
+# чем была проставлена дата изменения рецепта.
+SYNC_MARGIN = timedelta(minutes=1)
+
+
+class CoverageIndex:
+    """
+    Для каждого ингредиента хранит множество рецептов, в которые
+    он входит, а для каждого рецепта - множество его ингредиентов.
+    При изменении рецептов перечитываются только рецепты с новой
+    датой изменения; удаление рецептов перестраивает индекс целиком.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._versions = None
+        self._synced = None
+        self._recipes = {}
+        self._postings = defaultdict(set)
+
+    def _add(self, rows):
+        recipes = defaultdict(set)
+        for recipe_id, ingredient_id in rows:
+            recipes[recipe_id].add(ingredient_id)
+        for recipe_id, ingredients in recipes.items():
+            self._recipes[recipe_id] = frozenset(ingredients)
+            for ingredient_id in ingredients:
+                self._postings[ingredient_id].add(recipe_id)
+
+    def _remove(self, recipe_ids):
+        for recipe_id in recipe_ids:
+            for ingredient_id in self._recipes.pop(recipe_id, ()):
+                postings = self._postings[ingredient_id]
+                postings.discard(recipe_id)
+                if not postings:
+                    del self._postings[ingredient_id]
+
+    def _rebuild(self):
+        self._recipes = {}
+        self._postings = defaultdict(set)
+        self._add(RecipeIngredients.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).iterator())
+
+    def _sync(self, since):
+        changed = list(Recipe.objects.filter(
+            updated_at__gte=since
+        ).values_list('pk', flat=True))
+        self._remove(changed)
+        self._add(RecipeIngredients.objects.filter(
+            recipe_id__in=changed
+        ).values_list('recipe_id', 'ingredient_id'))
+
+    def _ensure_loaded(self):
+        versions = get_generations([DELETED_RECIPES, RECIPE_INGREDIENTS])
+        if versions == self._versions:
+            return
+        synced = timezone.now() - SYNC_MARGIN
+        if (
+            self._versions is None
+            or versions[DELETED_RECIPES] != self._versions[DELETED_RECIPES]
+        ):
+            self._rebuild()
+        else:
+            self._sync(self._synced)
+        self._versions = versions
+        self._synced = synced
+
+    def search(self, ingredient_ids, limit):
+        """
+        Возвращает до limit рецептов с наибольшим покрытием - долей
+        ингредиентов рецепта, которые есть в ingredient_ids.
+        Элементы результата: (id рецепта, покрытие, число имеющихся
+        ингредиентов, число ингредиентов рецепта).
+        """
+        with self._lock:
+            self._ensure_loaded()
+            matched = Counter()
+            for ingredient_id in set(ingredient_ids):
+                matched.update(self._postings.get(ingredient_id, ()))
+            return heapq.nlargest(
+                limit,
+                (
+                    (
+                        recipe_id, count / len(self._recipes[recipe_id]),
+                        count, len(self._recipes[recipe_id])
+                    )
+                    for recipe_id, count in matched.items()
+                ),
+                key=lambda item: (item[1], item[2], item[0])
+            )
+
+    def refresh(self):
+        """Перечитывает измененные рецепты во всех процессах."""
+        bump_generation(RECIPE_INGREDIENTS)
+
+    def invalidate(self):
+        """Перестраивает индекс во всех процессах."""
+        bump_generation(DELETED_RECIPES)
+
+
+coverage_index = CoverageIndex()
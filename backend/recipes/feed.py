@@ -0,0 +1,120 @@
+"""
+Лента новых рецептов авторов, на которых подписан пользователь.
+Для каждого пользователя в кэше хранится ограниченный список id
+рецептов, который пополняется при публикации рецепта (fan-out on write).
+Рецепты популярных авторов в списки не раскладываются,
+а выбираются из базы данных при чтении ленты (fan-out on read).
+В кэше хранятся только FEED_LENGTH новых рецептов; более старые
+страницы ленты выбираются из базы данных.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import AuthorCounters, Recipe, Subscribe
+
+FEED_KEY = 'feed:{}'
+FEED_LENGTH = 500
+FEED_TIMEOUT = 60 * 60 * 24
+# Авторы с таким числом подписчиков не раскладывают рецепты по лентам.
+FANOUT_LIMIT = 1000
+
+
+def get_followers_count(author_id):
+    return AuthorCounters.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first() or 0
+
+
+def followed_recipes(user_id, popular):
+    """Рецепты популярных (popular) или остальных авторов подписок."""
+    authors = Subscribe.objects.filter(user_id=user_id)
+    lookup = {'subscribed__counters__followers_count__gte': FANOUT_LIMIT}
+    if popular:
+        authors = authors.filter(**lookup)
+    else:
+        authors = authors.exclude(**lookup)
+    return Recipe.objects.filter(
+        author_id__in=authors.values('subscribed_id')
+    ).order_by('-pk')
+
+
+def build_feed(user_id):
+    """Список id рецептов ленты по данным базы, от новых к старым."""
+    return list(followed_recipes(user_id, popular=False).values_list(
+        'pk', flat=True
+    )[:FEED_LENGTH])
+
+
+def get_feed(user_id):
+    """Список id рецептов ленты из кэша; при промахе собирается заново."""
+    key = FEED_KEY.format(user_id)
+    feed = cache.get(key)
+    if feed is None:
+        feed = build_feed(user_id)
+        cache.set(key, feed, FEED_TIMEOUT)
+    return feed
+
+
+def get_feed_page(user_id, cursor=None, limit=FEED_LENGTH):
+    """
+    Id рецептов страницы ленты: не больше limit рецептов
+    с id меньше cursor, от новых к старым.
+    Удаленные рецепты остаются в списках кэша до их пересборки,
+    поэтому id из кэша проверяются по базе данных.
+    Если список в кэше заполнен и страница выходит за его конец,
+    более старые рецепты выбираются из базы данных.
+    """
+    feed = get_feed(user_id)
+    cached = [pk for pk in feed if cursor is None or pk < cursor]
+    page = []
+    while cached and len(page) < limit:
+        chunk, cached = cached[:limit], cached[limit:]
+        existing = set(Recipe.objects.filter(pk__in=chunk).values_list(
+            'pk', flat=True
+        ))
+        page.extend(pk for pk in chunk if pk in existing)
+    sources = [followed_recipes(user_id, popular=True)]
+    if len(feed) >= FEED_LENGTH and len(page) < limit:
+        sources.append(
+            followed_recipes(user_id, popular=False).filter(pk__lt=feed[-1])
+        )
+    for recipes in sources:
+        if cursor is not None:
+            recipes = recipes.filter(pk__lt=cursor)
+        page.extend(recipes.values_list('pk', flat=True)[:limit])
+    return sorted(set(page), reverse=True)[:limit]
+
+
+def fan_out(recipe):
+    """
+    Добавляет рецепт в начало лент подписчиков автора,
+    если ленты уже собраны в кэше. Выполняется после
+    фиксации транзакции, в которой создан рецепт.
+    При одновременных публикациях запись может потеряться,
+    поэтому ленты пересобираются не реже раза в FEED_TIMEOUT.
+    """
+    if get_followers_count(recipe.author_id) >= FANOUT_LIMIT:
+        return
+    keys = [
+        FEED_KEY.format(user_id)
+        for user_id in Subscribe.objects.filter(
+            subscribed_id=recipe.author_id
+        ).values_list('user_id', flat=True)
+    ]
+    feeds = cache.get_many(keys)
+    cache.set_many(
+        {
+            key: [recipe.pk] + feed[:FEED_LENGTH - 1]
+            for key, feed in feeds.items()
+        },
+        FEED_TIMEOUT
+    )
+
+
+def schedule_fan_out(recipe):
+    transaction.on_commit(lambda: fan_out(recipe))
+
+
+def invalidate_feed(user_id):
+    """Сбрасывает ленту пользователя, например после смены подписок."""
+    transaction.on_commit(lambda: cache.delete(FEED_KEY.format(user_id)))
@@ -0,0 +1,91 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from .images import thumbnail_urls
+
+
+class ThumbnailField(serializers.Field):
+    """
+    Ссылка на наименьшее превью картинки рецепта (image_thumb)
+    или набор превью в формате srcset (image_srcset).
+    По умолчанию источник - сам рецепт.
+    """
+
+    def __init__(self, srcset=False, **kwargs):
+        self.srcset = srcset
+        kwargs.setdefault('source', '*')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        urls = {
+            width: request.build_absolute_uri(url) if request else url
+            for width, url in thumbnail_urls(recipe).items()
+        }
+        if not urls:
+            return None
+        if self.srcset:
+            return ', '.join(
+                f'{url} {width}w' for width, url in sorted(urls.items())
+            )
+        return urls[min(urls)]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """
+    Список связанных объектов, которые загружаются
+    одним запросом перед проверкой каждого элемента.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str) and hasattr(data, '__iter__'):
+            self.child_relation.prefetch(data)
+        return super().to_internal_value(data)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField, который может заранее загрузить
+    объекты для списка первичных ключей запросом in_bulk.
+    Сообщения об ошибках совпадают с PrimaryKeyRelatedField.
+    """
+
+    def __init__(self, **kwargs):
+        self.prefetched = None
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        if isinstance(data, bool):
+            raise TypeError
+        return self.get_queryset().model._meta.pk.to_python(data)
+
+    def prefetch(self, data):
+        """Загружает объекты для всех ключей из data одним запросом."""
+        pks = set()
+        for item in data:
+            try:
+                pks.add(self.to_pk(item))
+            except (TypeError, ValueError, DjangoValidationError):
+                continue
+        self.prefetched = self.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data):
+        if self.prefetched is None:
+            return super().to_internal_value(data)
+        try:
+            pk = self.to_pk(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in self.prefetched:
+            self.fail('does_not_exist', pk_value=data)
+        return self.prefetched[pk]
@@ -0,0 +1,158 @@
+"""
+Фоновая обработка картинок рецептов.
+Картинка из запроса сохраняется в очередь (таблица ImageJob)
+и обрабатывается командой process_image_jobs вне веб-процесса.
+"""
+import base64
+import binascii
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import RECIPES, bump_generation, recipe_generation
+from .images import create_thumbnails
+from .models import ImageJob, Recipe
+
+MAX_ATTEMPTS = 3
+# Наибольший размер загружаемой картинки в пикселях. Картинки больше
+# него отклоняет decode_image, а больше вдвое - сам Pillow при чтении
+# заголовка (DecompressionBombError), не распаковывая данные.
+MAX_IMAGE_PIXELS = 40 * 1000 * 1000
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp')
+SAVE_FORMATS = {
+    'JPEG': ('jpg', {'quality': 90, 'optimize': True}),
+    'PNG': ('png', {'optimize': True}),
+    'WEBP': ('webp', {'quality': 90}),
+}
+
+
+class ImageProcessingError(Exception):
+    """Картинка не может быть обработана."""
+
+
+def enqueue_image(recipe, data):
+    """Ставит картинку рецепта в очередь на обработку."""
+    ImageJob.objects.filter(recipe=recipe).delete()
+    ImageJob.objects.create(recipe=recipe, data=data)
+    Recipe.objects.filter(pk=recipe.pk).update(
+        image_status=Recipe.IMAGE_PROCESSING, updated_at=timezone.now()
+    )
+    recipe.image_status = Recipe.IMAGE_PROCESSING
+
+
+def decode_image(data):
+    """
+    Декодирует картинку из base64 (в том числе data URI),
+    проверяет ее и перекодирует без метаданных EXIF и XMP.
+    Возвращает содержимое файла и расширение.
+    """
+    if data.startswith('data:') and ';base64,' in data:
+        data = data.split(';base64,', 1)[1]
+    try:
+        content = base64.b64decode(data)
+    except (binascii.Error, ValueError):
+        raise ImageProcessingError('Загруженный файл не является картинкой.')
+    try:
+        return encode_image(content)
+    except ImageProcessingError:
+        raise
+    except Exception as error:
+        # Испорченный файл может вызвать в декодерах Pillow
+        # исключение любого типа (DecompressionBombError, SyntaxError,
+        # struct.error), а функция не обращается к базе данных.
+        raise ImageProcessingError(
+            'Загруженный файл не является картинкой.'
+        ) from error
+
+
+def encode_image(content):
+    """Проверяет картинку и перекодирует ее без метаданных."""
+    image = Image.open(BytesIO(content))
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageProcessingError(
+            f'Картинка больше {MAX_IMAGE_PIXELS} пикселей.'
+        )
+    image.load()
+    image_format = image.format if image.format in SAVE_FORMATS else 'PNG'
+    extension, params = SAVE_FORMATS[image_format]
+    image = ImageOps.exif_transpose(image)
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    # Pillow переносит метаданные из info при сохранении некоторых
+    # форматов (например, EXIF в PNG), поэтому они удаляются явно.
+    for key in METADATA_KEYS:
+        image.info.pop(key, None)
+    buffer = BytesIO()
+    image.save(buffer, image_format, exif=b'', **params)
+    return buffer.getvalue(), extension
+
+
+def process_job(job):
+    """
+    Обрабатывает задание: сохраняет картинку рецепта и ее превью.
+    При ошибке картинки или хранилища выбрасывает исключение.
+    """
+    recipe = job.recipe
+    content, extension = decode_image(job.data)
+    recipe.image.save(f'image.{extension}', ContentFile(content), save=False)
+    recipe.has_thumbnails = False
+    recipe.image_status = Recipe.IMAGE_READY
+    recipe.save(update_fields=(
+        'image', 'has_thumbnails', 'image_status', 'updated_at'
+    ))
+    create_thumbnails(recipe)
+    job.delete()
+
+
+def mark_failed(job, error):
+    """
+    Отмечает неудачную попытку обработки задания в отдельной
+    транзакции. Испорченная картинка и исчерпанные попытки
+    переводят картинку рецепта в статус ошибки.
+    """
+    with transaction.atomic():
+        attempts = (
+            MAX_ATTEMPTS if isinstance(error, ImageProcessingError)
+            else job.attempts + 1
+        )
+        if attempts < MAX_ATTEMPTS:
+            ImageJob.objects.filter(pk=job.pk).update(
+                attempts=attempts, error=str(error)
+            )
+            return
+        if not ImageJob.objects.filter(pk=job.pk).delete()[0]:
+            # Задание уже заменено новой картинкой.
+            return
+        Recipe.objects.filter(pk=job.recipe_id).update(
+            image_status=Recipe.IMAGE_FAILED, updated_at=timezone.now()
+        )
+        bump_generation(recipe_generation(job.recipe_id))
+        bump_generation(RECIPES)
+
+
+def process_next_job():
+    """
+    Берет из очереди самое старое задание и обрабатывает его.
+    Задания, заблокированные другими обработчиками, пропускаются.
+    Возвращает None, если очередь пуста, True, если картинка
+    обработана, и False при ошибке картинки или хранилища.
+    Ошибки базы данных не перехватываются.
+    """
+    job = None
+    try:
+        with transaction.atomic():
+            job = ImageJob.objects.select_for_update(
+                skip_locked=True
+            ).select_related('recipe').order_by('created').first()
+            if job is None:
+                return None
+            process_job(job)
+    except (ImageProcessingError, OSError) as error:
+        mark_failed(job, error)
+        return False
+    return True
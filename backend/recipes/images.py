@@ -0,0 +1,99 @@
+"""
+Уменьшенные копии (превью) картинок рецептов.
+Превью хранятся рядом с оригиналом: recipes/<имя>_w<ширина>.<формат>.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+THUMBNAIL_WIDTHS = (320, 640)
+THUMBNAIL_FORMATS = (
+    ('webp', 'WEBP'),
+    ('jpg', 'JPEG'),
+)
+THUMBNAIL_QUALITY = 80
+
+
+def thumbnail_name(name, width, extension):
+    """Имя файла превью картинки name заданной ширины."""
+    stem, _ = os.path.splitext(name)
+    return f'{stem}_w{width}.{extension}'
+
+
+def open_image(file):
+    """Открывает картинку с учетом ориентации из EXIF и приводит к RGB."""
+    image = Image.open(file)
+    image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def thumbnail_names(name):
+    """Имена всех превью картинки name."""
+    return [
+        thumbnail_name(name, width, extension)
+        for width in THUMBNAIL_WIDTHS
+        for extension, _ in THUMBNAIL_FORMATS
+    ]
+
+
+def make_thumbnails(name, storage=default_storage, force=False):
+    """
+    Создает превью картинки name во всех размерах и форматах.
+    Картинки меньше заданной ширины не увеличиваются.
+    Имя картинки определяется ее содержимым, поэтому уже
+    существующие превью не пересоздаются без force.
+    """
+    if not force and all(map(storage.exists, thumbnail_names(name))):
+        return name
+    with storage.open(name) as file:
+        image = open_image(file)
+    for width in THUMBNAIL_WIDTHS:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((width, image.height), Image.LANCZOS)
+        for extension, image_format in THUMBNAIL_FORMATS:
+            buffer = BytesIO()
+            thumbnail.save(
+                buffer, image_format,
+                quality=THUMBNAIL_QUALITY, optimize=True
+            )
+            target = thumbnail_name(name, width, extension)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+    return name
+
+
+def create_thumbnails(recipe):
+    """Создает превью картинки рецепта и отмечает их наличие."""
+    if not recipe.image:
+        return
+    make_thumbnails(recipe.image.name)
+    type(recipe).objects.filter(pk=recipe.pk).update(
+        has_thumbnails=True, updated_at=timezone.now()
+    )
+    recipe.has_thumbnails = True
+
+
+def thumbnail_urls(recipe, extension='webp'):
+    """
+    Ссылки на превью картинки рецепта по ширине
+    или пустой словарь, если превью еще не созданы.
+    """
+    if not recipe.image or not recipe.has_thumbnails:
+        return {}
+    return {
+        width: default_storage.url(
+            thumbnail_name(recipe.image.name, width, extension)
+        )
+        for width in THUMBNAIL_WIDTHS
+    }
@@ -0,0 +1,73 @@
+"""
+Индекс ингредиентов в памяти процесса.
+Используется для поиска ингредиентов по началу названия
+без обращения к базе данных.
+"""
+from bisect import bisect_left
+from threading import Lock
+
+from .cache import INGREDIENTS, bump_generation, get_generation
+from .models import Ingredient
+
+SHORT_PREFIX_LENGTH = 2
+SHORT_PREFIX_LIMIT = 30
+
+
+class IngredientIndex:
+    """
+    Отсортированный по названию (без учета регистра) список ингредиентов.
+    Индекс загружается один раз на процесс и перечитывается,
+    когда меняется поколение каталога в кэше.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._keys = []
+        self._items = []
+
+    def _load(self, version):
+        rows = sorted(
+            (name.casefold(), name, pk, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        self._keys = [row[0] for row in rows]
+        self._items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, name, pk, measurement_unit in rows
+        ]
+        self._version = version
+
+    def _ensure_loaded(self):
+        version = get_generation(INGREDIENTS)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._load(version)
+
+    def search(self, prefix=''):
+        """
+        Возвращает ингредиенты, название которых начинается с prefix.
+        Для слишком коротких префиксов количество результатов ограничено.
+        """
+        self._ensure_loaded()
+        prefix = prefix.strip().casefold()
+        if not prefix:
+            return self._items
+        start = bisect_left(self._keys, prefix)
+        end = start
+        limit = len(self._keys)
+        if len(prefix) < SHORT_PREFIX_LENGTH:
+            limit = min(limit, start + SHORT_PREFIX_LIMIT)
+        while end < limit and self._keys[end].startswith(prefix):
+            end += 1
+        return self._items[start:end]
+
+    def invalidate(self):
+        """Сбрасывает индекс во всех процессах."""
+        bump_generation(INGREDIENTS)
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,59 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время выборки страницы рецептов через OFFSET '
+        '(с подсчетом количества) и по курсору в зависимости '
+        'от глубины страницы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--depths', type=float, nargs='+',
+            default=[0, 0.1, 0.25, 0.5, 0.75, 0.99],
+            help='Глубина страницы как доля от числа рецептов.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Количество повторов замера для каждой глубины.'
+        )
+
+    def measure(self, func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) * 1000 / repeat
+
+    def handle(self, *args, **options):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        repeat = options['repeat']
+        qs = Recipe.objects.order_by('-pub_date', '-id')
+        total = qs.count()
+        self.stdout.write(f'Рецептов: {total}')
+        self.stdout.write('offset\toffset, ms\tcursor, ms')
+        for depth in options['depths']:
+            offset = min(int(total * depth), max(total - 1, 0))
+            keyset = qs
+            if offset:
+                # Последняя строка предыдущей страницы - значение курсора.
+                pub_date, pk = qs.values_list('pub_date', 'id')[offset - 1]
+                keyset = qs.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+                )
+            offset_time = self.measure(
+                lambda: (qs.count(), list(qs[offset:offset + page_size])),
+                repeat
+            )
+            cursor_time = self.measure(
+                lambda: list(keyset[:page_size]), repeat
+            )
+            self.stdout.write('{}\t{:.2f}\t{:.2f}'.format(
+                offset, offset_time, cursor_time
+            ))
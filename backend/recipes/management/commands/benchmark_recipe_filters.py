@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время выборки первой страницы избранного '
+        'в зависимости от количества избранных рецептов пользователя.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=10,
+            help='Количество пользователей с наибольшим избранным.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Количество повторов замера для каждого пользователя.'
+        )
+
+    def handle(self, *args, **options):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        users = User.objects.annotate(
+            favorites_count=Count('favoriterecipes')
+        ).filter(favorites_count__gt=0).order_by(
+            '-favorites_count'
+        )[:options['users']]
+        self.stdout.write('favorites\tcount, ms\tpage, ms')
+        for user in users:
+            qs = Recipe.objects.with_related().with_user_flags(
+                user
+            ).filter(is_favorited=True)
+            count_time = page_time = 0
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                qs.count()
+                count_time += time.perf_counter() - started
+                started = time.perf_counter()
+                list(qs[:page_size])
+                page_time += time.perf_counter() - started
+            self.stdout.write('{}\t{:.2f}\t{:.2f}'.format(
+                user.favorites_count,
+                count_time * 1000 / options['repeat'],
+                page_time * 1000 / options['repeat'],
+            ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipes.cache import get_metrics
+
+CACHED_VIEWS = ('recipes', 'tags')
+
+
+class Command(BaseCommand):
+    help = 'Выводит количество попаданий и промахов кэша ответов API.'
+
+    def handle(self, *args, **options):
+        for name in CACHED_VIEWS:
+            metrics = get_metrics(name, 'hit', 'miss')
+            total = metrics['hit'] + metrics['miss']
+            ratio = metrics['hit'] / total * 100 if total else 0
+            self.stdout.write(
+                f"{name}: hit {metrics['hit']}, miss {metrics['miss']}, "
+                f'hit ratio {ratio:.1f}%'
+            )
@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.images import thumbnail_names
+from recipes.models import Recipe
+from recipes.storage import recipe_image_storage
+
+IMAGES_DIR = 'recipes'
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки рецептов и их превью, '
+        'на которые не ссылается ни один рецепт.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=60,
+            help=(
+                'Не удалять файлы моложе указанного числа минут: '
+                'они могут принадлежать еще не сохраненным рецептам.'
+            )
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать файлы, которые будут удалены.'
+        )
+
+    def get_referenced(self):
+        referenced = set()
+        for name in Recipe.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct().iterator():
+            referenced.add(name)
+            referenced.update(thumbnail_names(name))
+        return referenced
+
+    def handle(self, *args, **options):
+        storage = recipe_image_storage
+        if not storage.exists(IMAGES_DIR):
+            return
+        threshold = timezone.now() - timedelta(minutes=options['min_age'])
+        referenced = self.get_referenced()
+        removed = 0
+        for filename in storage.listdir(IMAGES_DIR)[1]:
+            name = f'{IMAGES_DIR}/{filename}'
+            if name in referenced:
+                continue
+            if storage.get_modified_time(name) > threshold:
+                continue
+            removed += 1
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Неиспользуемых файлов: {removed}.'
+        ))
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from recipes.models import (
+    FavoriteRecipes,
+    Ingredient,
+    Recipe,
+    ShoppingList,
+    Subscribe
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Выводит планы выполнения (EXPLAIN ANALYZE) основных запросов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int,
+            help='id пользователя для персональных запросов.'
+        )
+        parser.add_argument(
+            '--prefix', default='сах',
+            help='Начало названия для поиска ингредиентов.'
+        )
+
+    def get_queries(self, user, prefix):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        recipe = Recipe.objects.first()
+        author = recipe.author if recipe else user
+        queries = {
+            'Лента рецептов': Recipe.objects.with_user_flags(
+                user
+            )[:page_size],
+            'Рецепты автора': Recipe.objects.filter(
+                author=author
+            )[:page_size],
+            'Избранное пользователя': Recipe.objects.with_user_flags(
+                user
+            ).filter(is_favorited=True)[:page_size],
+            'Список покупок пользователя': Recipe.objects.with_user_flags(
+                user
+            ).filter(is_in_shopping_cart=True)[:page_size],
+            'Проверка избранного': FavoriteRecipes.objects.filter(
+                recipe=recipe, user=user
+            ),
+            'Проверка списка покупок': ShoppingList.objects.filter(
+                recipe=recipe, user=user
+            ),
+            'Проверка подписки': Subscribe.objects.filter(
+                subscribed=author, user=user
+            ),
+            'Поиск ингредиента': Ingredient.objects.filter(
+                name__istartswith=prefix
+            ),
+        }
+        return queries
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.get(pk=options['user'])
+        else:
+            user = User.objects.order_by('pk').first()
+        if user is None:
+            self.stderr.write('В базе нет пользователей.')
+            return
+        analyze = connection.vendor == 'postgresql'
+        for title, qs in self.get_queries(user, options['prefix']).items():
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(str(qs.query))
+            self.stdout.write(
+                qs.explain(analyze=True) if analyze else qs.explain()
+            )
+            self.stdout.write('')
@@ -0,0 +1,111 @@
+import csv
+import json
+import time
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.ingredients_index import ingredient_index
+from recipes.models import Ingredient
+
+CHUNK_SIZE = 64 * 1024
+JSON_SEPARATORS = '[, \t\r\n'
+
+
+def iter_json(file):
+    """
+    Построчно (по объектам) читает JSON-массив ингредиентов,
+    не загружая файл в память целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    for chunk in iter(partial(file.read, CHUNK_SIZE), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            while (position < len(buffer)
+                   and buffer[position] in JSON_SEPARATORS):
+                position += 1
+            if position == len(buffer) or buffer[position] == ']':
+                break
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item['name'], item['measurement_unit']
+        buffer = buffer[position:]
+    if buffer.strip(JSON_SEPARATORS + ']'):
+        raise CommandError('Некорректный JSON-файл ингредиентов.')
+
+
+def iter_csv(file):
+    """Читает CSV-файл со столбцами name, measurement_unit."""
+    for row in csv.reader(file):
+        if not row or row == ['name', 'measurement_unit']:
+            continue
+        yield row[0], row[1]
+
+
+READERS = {
+    'json': iter_json,
+    'csv': iter_csv,
+}
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из JSON- или CSV-файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=Path(settings.BASE_DIR) / 'data' / 'ingredients.json'
+        )
+        parser.add_argument(
+            '--format', choices=READERS.keys(),
+            help='Формат файла. По умолчанию определяется по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество ингредиентов в одном INSERT.'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неподдерживаемый формат файла: {path}')
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        seen = set()
+        batch = []
+        rows = 0
+        with path.open(encoding='utf-8', newline='') as file:
+            with transaction.atomic():
+                for name, measurement_unit in READERS[file_format](file):
+                    rows += 1
+                    key = (name.strip(), measurement_unit.strip())
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    batch.append(
+                        Ingredient(name=key[0], measurement_unit=key[1])
+                    )
+                    if len(batch) >= batch_size:
+                        Ingredient.objects.bulk_create(
+                            batch, ignore_conflicts=True
+                        )
+                        batch = []
+                if batch:
+                    Ingredient.objects.bulk_create(
+                        batch, ignore_conflicts=True
+                    )
+        ingredient_index.invalidate()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {rows}, уникальных ингредиентов: '
+            f'{len(seen)} за {elapsed:.2f} с '
+            f'({rows / max(elapsed, 1e-9):.0f} строк/с).'
+        ))
@@ -0,0 +1,56 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from recipes.cache import RECIPES, bump_generation, recipe_generation
+from recipes.images import make_thumbnails
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает превью для уже загруженных картинок рецептов '
+        'в нескольких процессах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Количество процессов. По умолчанию - по числу ядер.'
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать превью и для рецептов, у которых они есть.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(has_thumbnails=False)
+        images = defaultdict(list)
+        for name, pk in recipes.values_list('image', 'pk'):
+            images[name].append(pk)
+        connections.close_all()
+        done = []
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [
+                pool.submit(make_thumbnails, name, force=options['all'])
+                for name in images
+            ]
+            for future in as_completed(futures):
+                try:
+                    done.extend(images[future.result()])
+                except Exception as error:
+                    self.stderr.write(f'Ошибка обработки картинки: {error}')
+        Recipe.objects.filter(pk__in=done).update(
+            has_thumbnails=True, updated_at=timezone.now()
+        )
+        for pk in done:
+            bump_generation(recipe_generation(pk))
+        bump_generation(RECIPES)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {len(done)} из {recipes.count()}.'
+        ))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.image_jobs import process_next_job
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь картинок рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать текущую очередь и завершить работу.'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста.'
+        )
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        while True:
+            result = process_next_job()
+            if result is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            if result:
+                processed += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {processed}, с ошибкой: {failed}.'
+        ))
@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.cache import FAVORITES, bump_generation
+from recipes.counters import recount
+from recipes.models import (
+    AuthorCounters,
+    FavoriteRecipes,
+    Recipe,
+    ShoppingList,
+    Subscribe
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики избранного, списков покупок, '
+        'рецептов и подписчиков.'
+    )
+
+    def handle(self, *args, **options):
+        recipes, authors = recount(
+            Recipe, FavoriteRecipes, ShoppingList,
+            Subscribe, AuthorCounters, User
+        )
+        bump_generation(FAVORITES)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, авторов: {authors}.'
+        ))
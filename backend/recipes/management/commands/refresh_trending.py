@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from recipes.models import FavoriteRecipes, TrendingRecipe
+from recipes.trending import trending_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг популярных рецептов по добавлениям '
+        'в избранное за последние дни. Запускается периодически (cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=7,
+            help='Длина окна в днях.'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=500,
+            help='Количество рецептов в рейтинге.'
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        scores = FavoriteRecipes.objects.filter(
+            added__gte=since
+        ).values('recipe').annotate(
+            score=Count('id')
+        ).order_by('-score', '-recipe')[:options['limit']]
+        with transaction.atomic():
+            TrendingRecipe.objects.all().delete()
+            TrendingRecipe.objects.bulk_create(
+                TrendingRecipe(recipe_id=item['recipe'], score=item['score'])
+                for item in scores
+            )
+        trending_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'В рейтинге рецептов: {TrendingRecipe.objects.count()}.'
+        ))
@@ -0,0 +1,124 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import FavoriteRecipes, RecipeIngredients, RecipeNeighbour
+
+
+def group(rows):
+    """Разреженная матрица из пар (строка, столбец): строка - множество."""
+    matrix = defaultdict(set)
+    for row, column in rows:
+        matrix[row].add(column)
+    return matrix
+
+
+def transpose(matrix):
+    transposed = defaultdict(set)
+    for row, columns in matrix.items():
+        for column in columns:
+            transposed[column].add(row)
+    return transposed
+
+
+def co_occurrence(matrix, transposed, row):
+    """Число общих столбцов строки row с остальными строками matrix."""
+    counts = Counter()
+    for column in matrix[row]:
+        counts.update(transposed.get(column, ()))
+    del counts[row]
+    return counts
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие рецепты по сходству Жаккара наборов '
+        'ингредиентов и совместным добавлениям в избранное.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--neighbours', type=int, default=20,
+            help='Количество похожих рецептов для каждого рецепта.'
+        )
+        parser.add_argument(
+            '--weight', type=float, default=0.5,
+            help='Вес сходства по ингредиентам (0..1), '
+                 'остальное - вес совместного избранного.'
+        )
+        parser.add_argument(
+            '--max-share', type=float, default=0.2,
+            help='Ингредиенты, входящие в большую долю рецептов '
+                 '(соль, вода), не учитываются при поиске пар.'
+        )
+        parser.add_argument(
+            '--min-cutoff', type=int, default=200,
+            help='Ингредиент отбрасывается, только если входит '
+                 'больше чем в это число рецептов, поэтому в небольшом '
+                 'каталоге учитываются все ингредиенты.'
+        )
+        parser.add_argument(
+            '--max-favorites', type=int, default=500,
+            help='Избранное пользователей с большим числом рецептов '
+                 'не учитывается.'
+        )
+
+    def handle(self, *args, **options):
+        weight = options['weight']
+        ingredients = group(RecipeIngredients.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).iterator())
+        cutoff = max(
+            options['max_share'] * len(ingredients), options['min_cutoff']
+        )
+        recipes_by_ingredient = {
+            ingredient: recipes
+            for ingredient, recipes in transpose(ingredients).items()
+            if len(recipes) <= cutoff
+        }
+        favorites = {
+            user: recipes
+            for user, recipes in group(FavoriteRecipes.objects.values_list(
+                'user_id', 'recipe_id'
+            ).iterator()).items()
+            if len(recipes) <= options['max_favorites']
+        }
+        fans = transpose(favorites)
+
+        neighbours = []
+        for recipe in set(ingredients) | set(fans):
+            scores = Counter()
+            if recipe in ingredients:
+                size = len(ingredients[recipe])
+                for other, common in co_occurrence(
+                    ingredients, recipes_by_ingredient, recipe
+                ).items():
+                    scores[other] += weight * common / (
+                        size + len(ingredients[other]) - common
+                    )
+            if recipe in fans:
+                size = len(fans[recipe])
+                for other, common in co_occurrence(
+                    fans, favorites, recipe
+                ).items():
+                    scores[other] += (1 - weight) * common / math.sqrt(
+                        size * len(fans[other])
+                    )
+            neighbours.extend(
+                RecipeNeighbour(recipe_id=recipe, neighbour_id=other,
+                                score=score)
+                for other, score in heapq.nlargest(
+                    options['neighbours'], scores.items(),
+                    key=lambda item: (item[1], -item[0])
+                )
+            )
+
+        with transaction.atomic():
+            RecipeNeighbour.objects.all().delete()
+            RecipeNeighbour.objects.bulk_create(neighbours, batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(
+            f'Сохранено похожих рецептов: {len(neighbours)}.'
+        ))
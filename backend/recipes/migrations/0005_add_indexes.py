@@ -0,0 +1,58 @@
+# Generated by Django 4.1.3 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+INGREDIENT_PREFIX_INDEX = 'ingredient_name_prefix_idx'
+
+
+def add_ingredient_prefix_index(apps, schema_editor):
+    """
+    Индекс для поиска ингредиентов по началу названия
+    без учета регистра (name__istartswith). Только для PostgreSQL.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INGREDIENT_PREFIX_INDEX} '
+        'ON recipes_ingredient (UPPER(name) text_pattern_ops)'
+    )
+
+
+def delete_ingredient_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INGREDIENT_PREFIX_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscribe',
+            index=models.Index(fields=['subscribed', 'user'], name='subscribe_subscribed_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favoriterecipes',
+            index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglist',
+            index=models.Index(fields=['recipe', 'user'], name='shoppinglist_recipe_user_idx'),
+        ),
+        migrations.RunPython(
+            add_ingredient_prefix_index,
+            delete_ingredient_prefix_index
+        ),
+    ]
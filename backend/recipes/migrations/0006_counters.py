@@ -0,0 +1,52 @@
+# Generated by Django 4.1.3 on 2026-10-18 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from recipes.counters import recount
+
+
+def fill_counters(apps, schema_editor):
+    recount(
+        apps.get_model('recipes', 'Recipe'),
+        apps.get_model('recipes', 'FavoriteRecipes'),
+        apps.get_model('recipes', 'ShoppingList'),
+        apps.get_model('recipes', 'Subscribe'),
+        apps.get_model('recipes', 'AuthorCounters'),
+        apps.get_model(*settings.AUTH_USER_MODEL.split('.')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0005_add_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='cart_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Добавлено в списки покупок'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Добавлено в избранное'),
+        ),
+        migrations.CreateModel(
+            name='AuthorCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('recipes_count', models.PositiveIntegerField(default=0, verbose_name='Количество рецептов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков')),
+            ],
+            options={
+                'verbose_name': 'Счетчики автора',
+                'verbose_name_plural': 'Счетчики авторов',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.1.3 on 2026-10-18 13:00
+
+import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Дата добавления существующих записей избранного неизвестна:
+# они получают дату вне любого периода популярности, иначе
+# все старые добавления в избранное считались бы сегодняшними.
+UNKNOWN_ADDED = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favoriterecipes',
+            name='added',
+            field=models.DateTimeField(auto_now_add=True, default=UNKNOWN_ADDED, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='favoriterecipes',
+            index=models.Index(fields=['added'], name='favorite_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-pub_date'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.CreateModel(
+            name='TrendingRecipe',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('score', models.PositiveIntegerField(verbose_name='Добавлений в избранное за период')),
+            ],
+            options={
+                'verbose_name': 'Популярный рецепт',
+                'verbose_name_plural': 'Популярные рецепты',
+                'ordering': ('-score', '-recipe_id'),
+            },
+        ),
+    ]
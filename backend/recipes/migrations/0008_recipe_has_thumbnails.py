@@ -0,0 +1,18 @@
+# Generated by Django 4.1.3 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='has_thumbnails',
+            field=models.BooleanField(default=False, verbose_name='Превью картинки созданы'),
+        ),
+    ]
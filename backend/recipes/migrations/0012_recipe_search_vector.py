@@ -0,0 +1,44 @@
+# Generated by Django 4.1.3 on 2026-10-18 18:00
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from recipes.search import update_search_vectors
+
+SEARCH_VECTOR_INDEX = 'recipe_search_vector_idx'
+
+
+def add_search_vector_index(apps, schema_editor):
+    """GIN-индекс поискового документа рецептов. Только для PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {SEARCH_VECTOR_INDEX} '
+        'ON recipes_recipe USING GIN (search_vector)'
+    )
+    update_search_vectors(apps.get_model('recipes', 'Recipe').objects.all())
+
+
+def delete_search_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_VECTOR_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый документ'),
+        ),
+        migrations.RunPython(
+            add_search_vector_index,
+            delete_search_vector_index
+        ),
+    ]
@@ -0,0 +1,104 @@
+import hashlib
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .cache import get_generation, record_metric
+
+RESPONSE_CACHE_KEY = 'response:{}:{}:{}'
+
+
+class AnonymousCacheMixin:
+    """
+    Кэширует ответы метода list для анонимных пользователей.
+    Ключ кэша содержит нормализованную строку запроса и поколения
+    данных cache_generations, поэтому изменение данных сразу
+    делает устаревшими все сохраненные ответы.
+    """
+
+    cache_generations = ()
+    cache_timeout = 60 * 10
+
+    def get_cache_generations(self, request):
+        """Поколения данных, от которых зависит ответ на запрос."""
+        return self.cache_generations
+
+    def get_response_cache_key(self, request):
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        )
+        generations = '-'.join(
+            str(get_generation(name))
+            for name in self.get_cache_generations(request)
+        )
+        digest = hashlib.md5(
+            f'{request.get_host()}?{params}'.encode()
+        ).hexdigest()
+        return RESPONSE_CACHE_KEY.format(self.basename, generations, digest)
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            record_metric(self.basename, 'hit')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        record_metric(self.basename, 'miss')
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Отвечает 304 Not Modified на условные GET-запросы list и retrieve.
+    Валидаторы (ETag и дату изменения) возвращает get_validators;
+    они вычисляются дешевле ответа, поэтому при совпадении
+    данные не выбираются и не сериализуются.
+    """
+
+    def get_validators(self, request):
+        """
+        Возвращает пару (etag, last_modified) для текущего действия.
+        None вместо значения отключает соответствующий валидатор.
+        """
+        return None, None
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        if etag is not None:
+            etag = quote_etag(
+                f'{request.accepted_renderer.format}-{etag}'
+            )
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            if etag is not None:
+                response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
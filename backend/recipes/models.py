@@ -1,8 +1,12 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Value
 from django.contrib.auth import get_user_model
 from colorfield.fields import ColorField
 from django import forms
 
+from .storage import recipe_image_storage
+
 User = get_user_model()
 
 
@@ -33,10 +37,51 @@ class Subscribe(models.Model):
                 name='unique_subscribe'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['subscribed', 'user'],
+                name='subscribe_subscribed_user_idx'
+            ),
+        ]
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
 
 
+class AuthorCounters(models.Model):
+    """Счетчики рецептов и подписчиков пользователя"""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь'
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество подписчиков'
+    )
+
+    class Meta:
+        verbose_name = "Счетчики автора"
+        verbose_name_plural = "Счетчики авторов"
+
+    def __str__(self):
+        return str(self.user)
+
+    @classmethod
+    def increment(cls, user_id, field, delta=1):
+        """Атомарно изменяет счетчик пользователя на delta."""
+        counters = cls.objects.filter(user_id=user_id)
+        if delta < 0:
+            counters = counters.filter(**{f'{field}__gte': -delta})
+        if not counters.update(**{field: F(field) + delta}) and delta > 0:
+            cls.objects.get_or_create(user_id=user_id)
+            counters.update(**{field: F(field) + delta})
+
+
 class Tag(models.Model):
     """Модель тегов рецептов"""
     name = models.TextField(unique=True, verbose_name='тэг')
@@ -60,13 +105,89 @@ class Ingredient(models.Model):
         return self.name
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            ),
+        ]
         verbose_name = "Ингредиент"
         verbose_name_plural = "Ингредиенты"
         ordering = ('name',)
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Кверисет рецептов с подготовкой данных для сериализации"""
+
+    @staticmethod
+    def related_lookups():
+        """Связи рецепта, которые подгружаются для сериализации."""
+        return (
+            'tags',
+            Prefetch(
+                'recipeingredients',
+                queryset=RecipeIngredients.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
+
+    def with_related(self):
+        """
+        Подгружает автора, тэги и ингредиенты рецептов
+        фиксированным количеством запросов.
+        """
+        return self.select_related('author').prefetch_related(
+            *self.related_lookups()
+        )
+
+    def increment(self, field, delta=1):
+        """Атомарно изменяет счетчик рецептов на delta."""
+        qs = self
+        if delta < 0:
+            qs = qs.filter(**{f'{field}__gte': -delta})
+        return qs.update(**{field: F(field) + delta})
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует рецепты признаками is_favorited, is_in_shopping_cart
+        и author_is_subscribed для пользователя.
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                author_is_subscribed=Value(False)
+            )
+        return self.annotate(
+            is_favorited=Exists(FavoriteRecipes.objects.filter(
+                recipe=OuterRef('pk'), user=user
+            )),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                recipe=OuterRef('pk'), user=user
+            )),
+            author_is_subscribed=Exists(Subscribe.objects.filter(
+                subscribed=OuterRef('author'), user=user
+            ))
+        )
+
+
 class Recipe(models.Model):
     """Модель рецептов"""
+    IMAGE_READY = 'ready'
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = (
+        (IMAGE_READY, 'Готова'),
+        (IMAGE_PROCESSING, 'Обрабатывается'),
+        (IMAGE_FAILED, 'Ошибка обработки'),
+    )
+    # Поля, которые меняются только отдельными UPDATE и не должны
+    # перезаписываться значениями, прочитанными до сохранения.
+    DERIVED_FIELDS = ('favorites_count', 'cart_count', 'search_vector')
+    # Поля, которые записывает обработчик картинок.
+    IMAGE_FIELDS = ('image', 'has_thumbnails', 'image_status')
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -77,6 +198,7 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='recipes/',
+        storage=recipe_image_storage,
         blank=True
     )
     text = models.TextField(verbose_name='Описание блюда')
@@ -92,15 +214,90 @@ class Recipe(models.Model):
     )
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации')
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name='Дата изменения'
+    )
+    search_vector = SearchVectorField(
+        null=True, editable=False, verbose_name='Поисковый документ'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0, verbose_name='Добавлено в избранное'
+    )
+    cart_count = models.PositiveIntegerField(
+        default=0, verbose_name='Добавлено в списки покупок'
+    )
+    has_thumbnails = models.BooleanField(
+        default=False, verbose_name='Превью картинки созданы'
+    )
+    image_status = models.CharField(
+        max_length=16,
+        choices=IMAGE_STATUSES,
+        default=IMAGE_READY,
+        verbose_name='Статус обработки картинки'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date'],
+                name='recipe_favorites_count_idx'
+            ),
+        ]
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
 
     def __str__(self):
         return self.name
 
+    def get_update_fields(self, exclude=()):
+        """Поля для сохранения изменений без полей из DERIVED_FIELDS."""
+        exclude = self.DERIVED_FIELDS + tuple(exclude)
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.name not in exclude
+        ]
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding and not args
+            and kwargs.get('update_fields') is None
+        ):
+            kwargs['update_fields'] = self.get_update_fields()
+        super().save(*args, **kwargs)
+
+
+class ImageJob(models.Model):
+    """Задание на обработку картинки рецепта"""
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='image_jobs',
+        verbose_name='Рецепт'
+    )
+    data = models.TextField(verbose_name='Картинка в base64')
+    created = models.DateTimeField(
+        auto_now_add=True, verbose_name='Дата создания'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0, verbose_name='Количество попыток'
+    )
+    error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+
+    class Meta:
+        ordering = ('created',)
+        verbose_name = 'Обработка картинки'
+        verbose_name_plural = 'Очередь обработки картинок'
+
 
 class RecipeIngredients(models.Model):
     """Модель для учета ингредиентов, добавленных в рецепты"""
@@ -130,6 +327,9 @@ class FavoriteRecipes(models.Model):
         on_delete=models.CASCADE,
     )
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    added = models.DateTimeField(
+        auto_now_add=True, verbose_name='Дата добавления'
+    )
 
     class Meta:
         constraints = [
@@ -138,6 +338,16 @@ class FavoriteRecipes(models.Model):
                 name='unique_favorite_recipe'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='favorite_recipe_user_idx'
+            ),
+            models.Index(
+                fields=['added'],
+                name='favorite_added_idx'
+            ),
+        ]
         verbose_name = "Избранный рецепт"
         verbose_name_plural = "Избранные рецепты"
 
@@ -164,5 +374,68 @@ class ShoppingList(models.Model):
                 name='unique_shoppingcart_recipe'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='shoppinglist_recipe_user_idx'
+            ),
+        ]
         verbose_name = "Рецепт в списке покупок"
         verbose_name_plural = "Список покупок"
+
+
+class TrendingRecipe(models.Model):
+    """
+    Рейтинг рецептов по количеству добавлений в избранное
+    за последний период. Пересчитывается командой refresh_trending.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Рецепт'
+    )
+    score = models.PositiveIntegerField(
+        verbose_name='Добавлений в избранное за период'
+    )
+
+    class Meta:
+        ordering = ('-score', '-recipe_id')
+        verbose_name = "Популярный рецепт"
+        verbose_name_plural = "Популярные рецепты"
+
+
+class RecipeNeighbour(models.Model):
+    """
+    Похожие рецепты: сходство по ингредиентам и по совместным
+    добавлениям в избранное. Пересчитывается командой similar_recipes.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='neighbours',
+        verbose_name='Рецепт'
+    )
+    neighbour = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        ordering = ('recipe', '-score')
+        verbose_name = "Похожий рецепт"
+        verbose_name_plural = "Похожие рецепты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'neighbour'], name='unique_neighbour'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'], name='neighbour_recipe_score_idx'
+            ),
+        ]
@@ -1,5 +1,29 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import Paginator
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class LimitPagination(PageNumberPagination):
+    """
+    Постраничный вывод page/limit. Если число объектов уже
+    посчитано (например, для ETag), оно передается в object_count
+    и повторно не запрашивается.
+    """
+    page_size_query_param = 'limit'
+    object_count = None
+
+    def django_paginator_class(self, object_list, per_page):
+        paginator = Paginator(object_list, per_page)
+        if self.object_count is not None:
+            paginator.count = self.object_count
+        return paginator
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Постраничный вывод рецептов по курсору (?cursor=).
+    Следующая страница выбирается условием по дате публикации
+    вместо OFFSET, а общее количество рецептов не считается,
+    поэтому время выдачи не зависит от номера страницы.
+    """
+    ordering = ('-pub_date', '-id')
     page_size_query_param = 'limit'
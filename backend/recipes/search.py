@@ -0,0 +1,87 @@
+"""
+Полнотекстовый поиск рецептов.
+В PostgreSQL поисковый документ (название, ингредиенты, описание)
+хранится в поле Recipe.search_vector с GIN-индексом;
+в остальных СУБД поиск выполняется через icontains.
+"""
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector
+)
+from django.db import connection, transaction
+from django.db.models import (
+    Exists,
+    F,
+    Func,
+    OuterRef,
+    Q,
+    Subquery,
+    TextField,
+    Value
+)
+
+SEARCH_CONFIG = 'russian'
+
+
+def search_document(recipe_model):
+    """
+    Выражение поискового документа рецепта: название (вес A),
+    названия ингредиентов (вес B) и описание (вес C).
+    """
+    names = recipe_model.ingredients.through.objects.filter(
+        recipe=OuterRef('pk')
+    ).order_by().values('recipe').annotate(
+        names=Func(
+            F('ingredient__name'), Value(' '),
+            function='STRING_AGG', output_field=TextField()
+        )
+    ).values('names')
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            Subquery(names, output_field=TextField()),
+            weight='B', config=SEARCH_CONFIG
+        )
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(recipes):
+    """
+    Пересчитывает поисковые документы рецептов recipes одним UPDATE.
+    Модель берется из queryset, поэтому функцию можно
+    использовать и в миграциях.
+    """
+    if connection.vendor != 'postgresql':
+        return 0
+    return recipes.update(search_vector=search_document(recipes.model))
+
+
+def schedule_search_update(recipes):
+    """
+    Пересчитывает поисковые документы после фиксации транзакции,
+    когда ингредиенты рецептов уже записаны.
+    """
+    transaction.on_commit(lambda: update_search_vectors(recipes))
+
+
+def search_recipes(queryset, text):
+    """
+    Отбирает рецепты queryset, подходящие под запрос text.
+    В PostgreSQL результаты упорядочены по релевантности.
+    """
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            text, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-pub_date')
+    return queryset.filter(
+        Q(name__icontains=text)
+        | Q(text__icontains=text)
+        | Q(Exists(queryset.model.ingredients.through.objects.filter(
+            recipe=OuterRef('pk'), ingredient__name__icontains=text
+        )))
+    )
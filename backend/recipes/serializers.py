@@ -2,9 +2,12 @@ from rest_framework import serializers
 
 from django.contrib.auth import get_user_model
 from drf_extra_fields.fields import Base64ImageField
-from django.db import transaction
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import prefetch_related_objects
 from .models import (
     Recipe,
+    RecipeQuerySet,
     Ingredient,
     Tag,
     FavoriteRecipes,
@@ -12,6 +15,16 @@ from .models import (
     RecipeIngredients,
     Subscribe
 )
+from .cache import INGREDIENTS, TAGS, get_generations, recipe_generation
+from .fields import BulkPrimaryKeyRelatedField, ThumbnailField
+from .image_jobs import enqueue_image
+
+MAX_IMAGE_LENGTH = 10 * 1024 * 1024
+FRAGMENT_KEY = 'recipe_fragment:{}:{}:{}:{}'
+FRAGMENT_TIMEOUT = 60 * 60
+MAX_BULK_IDS = 100
+# Наибольшее значение BigAutoField: большие id не доходят до базы данных.
+MAX_RECIPE_ID = 2 ** 63 - 1
 
 User = get_user_model()
 
@@ -40,11 +53,16 @@ class FavoriteSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='recipe.id')
     name = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
+    image_thumb = ThumbnailField(source='recipe')
+    image_srcset = ThumbnailField(source='recipe', srcset=True)
     cooking_time = serializers.SerializerMethodField()
 
     class Meta:
         model = FavoriteRecipes
-        fields = ('user', 'id', 'name', 'image', 'cooking_time')
+        fields = (
+            'user', 'id', 'name', 'image', 'image_thumb', 'image_srcset',
+            'cooking_time'
+        )
 
     def get_name(self, obj):
         return obj.recipe.name
@@ -82,7 +100,10 @@ class ShoppingCartSerializer(FavoriteSerializer):
 
     class Meta:
         model = ShoppingList
-        fields = ('user', 'id', 'name', 'image', 'cooking_time')
+        fields = (
+            'user', 'id', 'name', 'image', 'image_thumb', 'image_srcset',
+            'cooking_time'
+        )
 
     def validate(self, data):
         try:
@@ -101,18 +122,45 @@ class ShoppingCartSerializer(FavoriteSerializer):
         return data
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """
+    Сериалайзер списка id рецептов для массового добавления
+    и удаления рецептов в избранном и списке покупок.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=MAX_RECIPE_ID),
+        allow_empty=False,
+        max_length=MAX_BULK_IDS
+    )
+
+
+class RecipeIngredientsListSerializer(serializers.ListSerializer):
+    """
+    Список ингредиентов рецепта. Все ингредиенты из запроса
+    загружаются одним запросом до проверки отдельных строк.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child.fields['id'].prefetch(
+                item.get('id') for item in data if isinstance(item, dict)
+            )
+        return super().to_internal_value(data)
+
+
 class RecipeIngredientsSerializer(serializers.ModelSerializer):
     """
     Сериализатор списка ингредиентов, вложенный в RecipeSerializer.
     """
 
     recipe = serializers.PrimaryKeyRelatedField(read_only=True)
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = BulkPrimaryKeyRelatedField(queryset=Ingredient.objects.all())
     amount = serializers.IntegerField(write_only=True, min_value=1)
 
     class Meta:
         model = RecipeIngredients
         fields = ('recipe', 'id', 'amount')
+        list_serializer_class = RecipeIngredientsListSerializer
 
     def validate_amount(self, value):
         if value < 1 or value > 32767:
@@ -129,10 +177,12 @@ class RecipeSerializer(serializers.ModelSerializer):
     """
 
     ingredients = RecipeIngredientsSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True, required=True
     )
-    image = Base64ImageField()
+    image = serializers.CharField(
+        write_only=True, max_length=MAX_IMAGE_LENGTH
+    )
 
     class Meta:
         model = Recipe
@@ -151,11 +201,14 @@ class RecipeSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """
         Создание рецепта.
+        Картинка обрабатывается в фоне командой process_image_jobs.
         """
 
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
+        image = validated_data.pop('image')
         recipe = Recipe.objects.create(**validated_data)
+        enqueue_image(recipe, image)
         recipe.tags.set(tags)
         create_ingredients = [
             RecipeIngredients(
@@ -168,27 +221,64 @@ class RecipeSerializer(serializers.ModelSerializer):
         RecipeIngredients.objects.bulk_create(create_ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """
         Редактирование рецепта.
+        Новая картинка обрабатывается в фоне командой process_image_jobs.
         """
 
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        image = validated_data.pop('image', None)
+        if image is not None:
+            enqueue_image(instance, image)
         if tags is not None:
             instance.tags.set(tags)
         if ingredients is not None:
-            instance.ingredients.clear()
-            create_ingredients = [
-                RecipeIngredients(
-                    recipe=instance,
-                    ingredient=ingredient['id'],
-                    amount=ingredient['amount']
-                )
-                for ingredient in ingredients
-            ]
+            self.update_ingredients(instance, ingredients)
+        # Сохраняются только измененные поля: счетчики и картинку
+        # в это время могут менять другие запросы и обработчик картинок.
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=(*validated_data, 'updated_at'))
+        return instance
+
+    def update_ingredients(self, recipe, ingredients):
+        """
+        Приводит ингредиенты рецепта к новому списку, изменяя только
+        добавленные, удаленные и строки с другим количеством.
+        """
+        current = {
+            line.ingredient_id: line
+            for line in RecipeIngredients.objects.filter(recipe=recipe)
+        }
+        amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        create_ingredients = []
+        update_ingredients = []
+        for ingredient_id, amount in amounts.items():
+            line = current.get(ingredient_id)
+            if line is None:
+                create_ingredients.append(RecipeIngredients(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                ))
+            elif line.amount != amount:
+                line.amount = amount
+                update_ingredients.append(line)
+        deleted = current.keys() - amounts.keys()
+        if deleted:
+            RecipeIngredients.objects.filter(
+                recipe=recipe, ingredient_id__in=deleted
+            ).delete()
+        if update_ingredients:
+            RecipeIngredients.objects.bulk_update(
+                update_ingredients, ('amount',)
+            )
+        if create_ingredients:
             RecipeIngredients.objects.bulk_create(create_ingredients)
-        return super().update(instance, validated_data)
 
     def validate_ingredients(self, value):
         if len(value) < 1:
@@ -226,6 +316,8 @@ class AuthorRecipeGetSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         return (user.is_authenticated
                 and Subscribe.objects.filter(
@@ -247,18 +339,14 @@ class IngredientsGetRecipeSerializer(serializers.ModelSerializer):
     Используется для метода GET вьюсета RecipeViewSet.
     """
 
-    name = serializers.SerializerMethodField()
-    measurement_unit = serializers.SerializerMethodField()
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
     id = serializers.PrimaryKeyRelatedField(
         source='ingredient_id', read_only=True
     )
 
-    def get_name(self, obj):
-        return Ingredient.objects.get(id=obj.ingredient_id).name
-
-    def get_measurement_unit(self, obj):
-        return Ingredient.objects.get(id=obj.ingredient_id).measurement_unit
-
     class Meta:
         model = RecipeIngredients
         fields = (
@@ -266,11 +354,31 @@ class IngredientsGetRecipeSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeGetListSerializer(serializers.ListSerializer):
+    """
+    Список рецептов для метода GET. Общие для всех пользователей
+    данные рецептов читаются из кэша одним запросом, тэги
+    и ингредиенты загружаются только для рецептов без кэша.
+    """
+
+    def to_representation(self, data):
+        recipes = list(
+            data.all() if isinstance(data, models.Manager) else data
+        )
+        return self.child.to_representation_many(recipes)
+
+
 class RecipeGetSerializer(serializers.ModelSerializer):
     """
     Сериализатор вьюсета RecipeViewSet для метода GET.
+    Данные рецепта, не зависящие от пользователя, кэшируются
+    по id, поколению и дате изменения рецепта; автор и отметки пользователя
+    (is_favorited, is_in_shopping_cart, is_subscribed)
+    добавляются при каждом запросе.
     """
 
+    USER_FIELDS = ('author', 'is_favorited', 'is_in_shopping_cart')
+
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     ingredients = IngredientsGetRecipeSerializer(
@@ -278,22 +386,100 @@ class RecipeGetSerializer(serializers.ModelSerializer):
     )
     tags = TagSerializer(many=True)
     image = Base64ImageField()
+    image_thumb = ThumbnailField()
+    image_srcset = ThumbnailField(srcset=True)
     author = AuthorRecipeGetSerializer()
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         return (user.is_authenticated and FavoriteRecipes.objects.filter(
             recipe=obj, user=user).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         return (user.is_authenticated and ShoppingList.objects.filter(
             recipe=obj, user=user).exists())
 
+    def get_fragment(self, obj):
+        """Данные рецепта, не зависящие от пользователя."""
+        fragment = {}
+        for field in self._readable_fields:
+            if field.field_name in self.USER_FIELDS:
+                continue
+            attribute = field.get_attribute(obj)
+            fragment[field.field_name] = (
+                None if attribute is None
+                else field.to_representation(attribute)
+            )
+        return fragment
+
+    def get_user_data(self, obj):
+        """Автор рецепта и отметки текущего пользователя."""
+        if hasattr(obj, 'author_is_subscribed'):
+            obj.author.is_subscribed = obj.author_is_subscribed
+        return {
+            'author': self.fields['author'].to_representation(obj.author),
+            'is_favorited': self.get_is_favorited(obj),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(obj),
+        }
+
+    def get_fragment_keys(self, recipes):
+        request = self.context.get('request')
+        host = request.get_host() if request else ''
+        generations = get_generations(
+            [INGREDIENTS, TAGS]
+            + [recipe_generation(recipe.pk) for recipe in recipes]
+        )
+        common = f'{generations[INGREDIENTS]}-{generations[TAGS]}'
+        return {
+            recipe.pk: FRAGMENT_KEY.format(
+                host, common, recipe.pk,
+                '{}-{}'.format(
+                    generations[recipe_generation(recipe.pk)],
+                    recipe.updated_at.timestamp()
+                )
+            )
+            for recipe in recipes
+        }
+
+    def to_representation_many(self, recipes):
+        keys = self.get_fragment_keys(recipes)
+        fragments = cache.get_many(keys.values())
+        missing = [
+            recipe for recipe in recipes if keys[recipe.pk] not in fragments
+        ]
+        if missing:
+            prefetch_related_objects(
+                missing, *RecipeQuerySet.related_lookups()
+            )
+            rendered = {
+                keys[recipe.pk]: self.get_fragment(recipe)
+                for recipe in missing
+            }
+            cache.set_many(rendered, FRAGMENT_TIMEOUT)
+            fragments.update(rendered)
+        representation = []
+        for recipe in recipes:
+            data = dict(fragments[keys[recipe.pk]])
+            data.update(self.get_user_data(recipe))
+            representation.append(
+                {name: data[name] for name in self.Meta.fields}
+            )
+        return representation
+
+    def to_representation(self, obj):
+        return self.to_representation_many([obj])[0]
+
     class Meta:
         model = Recipe
+        list_serializer_class = RecipeGetListSerializer
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time'
+            'name', 'image', 'image_thumb', 'image_srcset', 'image_status',
+            'text', 'cooking_time'
         )
@@ -0,0 +1,91 @@
+"""
+Построчная выгрузка списка покупок пользователя
+в форматах txt, csv и json.
+"""
+import csv
+import json
+
+from django.db.models import Count, Max, Sum
+
+from .cache import INGREDIENTS, get_generations, user_generation
+from .models import RecipeIngredients, ShoppingList
+
+
+def get_purchases(user):
+    """
+    Суммарное количество каждого ингредиента из рецептов
+    в списке покупок пользователя, отсортированное по названию.
+    """
+    return RecipeIngredients.objects.filter(
+        recipe__shoppingcart__user=user
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(
+        total_amt=Sum('amount')
+    ).order_by(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).iterator()
+
+
+def get_cart_version(user):
+    """
+    Версия списка покупок пользователя. Поколение пользователя
+    меняется при добавлении и удалении рецептов в список,
+    дата изменения рецептов - при изменении их ингредиентов,
+    поколение справочника - при переименовании ингредиентов.
+    """
+    cart = ShoppingList.objects.filter(user=user).aggregate(
+        count=Count('id'), updated=Max('recipe__updated_at')
+    )
+    generations = get_generations([user_generation(user.pk), INGREDIENTS])
+    return '{}-{}-{}-{}'.format(
+        generations[user_generation(user.pk)], generations[INGREDIENTS],
+        cart['count'],
+        cart['updated'].timestamp() if cart['updated'] else 0
+    )
+
+
+class Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_txt(purchases):
+    for item in purchases:
+        yield (
+            f"{item['ingredient__name']} "
+            f"{item['ingredient__measurement_unit']} - "
+            f"{item['total_amt']}\n"
+        )
+
+
+def render_csv(purchases):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in purchases:
+        yield writer.writerow((
+            item['ingredient__name'],
+            item['ingredient__measurement_unit'],
+            item['total_amt'],
+        ))
+
+
+def render_json(purchases):
+    separator = '['
+    for item in purchases:
+        yield separator + json.dumps({
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['total_amt'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+RENDERERS = {
+    'txt': render_txt,
+    'csv': render_csv,
+    'json': render_json,
+}
@@ -0,0 +1,108 @@
+from threading import local
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import RECIPES, TAGS, bump_generation, recipe_generation
+from .coverage_index import coverage_index
+from .ingredients_index import ingredient_index
+from .models import Ingredient, Recipe, RecipeIngredients, Tag
+from .search import schedule_search_update, update_search_vectors
+
+# Рецепты, измененные в текущей транзакции потока: id - нужно ли
+# обновить дату изменения.
+_changed = local()
+
+
+def schedule_recipe_update(recipe_id, touch=False):
+    """
+    Обновляет поисковый документ, индекс подбора по ингредиентам
+    и кэш рецепта после фиксации транзакции один раз, сколько бы
+    строк рецепта ни изменилось; touch обновляет дату изменения.
+    """
+    recipes = getattr(_changed, 'recipes', None)
+    if recipes is None:
+        recipes = _changed.recipes = {}
+    recipes[recipe_id] = recipes.get(recipe_id, False) or touch
+    transaction.on_commit(update_changed_recipes)
+
+
+def update_changed_recipes():
+    recipes = getattr(_changed, 'recipes', None)
+    if not recipes:
+        return
+    _changed.recipes = {}
+    touched = [pk for pk, touch in recipes.items() if touch]
+    if touched:
+        Recipe.objects.filter(pk__in=touched).update(
+            updated_at=timezone.now()
+        )
+    update_search_vectors(Recipe.objects.filter(pk__in=recipes))
+    coverage_index.refresh()
+    for pk in recipes:
+        bump_generation(recipe_generation(pk))
+    bump_generation(RECIPES)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Сбрасывает индекс ингредиентов при изменении каталога."""
+    ingredient_index.invalidate()
+    bump_generation(RECIPES)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search(sender, instance, created, **kwargs):
+    """Обновляет поисковые документы рецептов с измененным ингредиентом."""
+    if not created:
+        schedule_search_update(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe(sender, instance, **kwargs):
+    """
+    Обновляет поисковый документ, индекс подбора по ингредиентам
+    и кэш измененного рецепта.
+    """
+    schedule_recipe_update(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш рецепта и ответов со списками рецептов
+    и перестраивает индекс подбора по ингредиентам.
+    """
+    bump_generation(recipe_generation(instance.pk))
+    bump_generation(RECIPES)
+    coverage_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredients)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    """Обновляет рецепт при изменении его ингредиентов."""
+    schedule_recipe_update(instance.recipe_id, touch=True)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, reverse, pk_set, **kwargs):
+    """Сбрасывает кэш рецептов при изменении их тэгов."""
+    if not kwargs['action'].startswith('post_'):
+        return
+    if not reverse:
+        bump_generation(recipe_generation(instance.pk))
+    elif pk_set is None:
+        bump_generation(TAGS)
+    else:
+        for pk in pk_set:
+            bump_generation(recipe_generation(pk))
+    bump_generation(RECIPES)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    """Сбрасывает кэш ответов со списками тэгов и рецептов."""
+    bump_generation(TAGS)
+    bump_generation(RECIPES)
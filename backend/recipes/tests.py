@@ -0,0 +1,432 @@
+import base64
+import shutil
+import struct
+import tempfile
+import warnings
+import zlib
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .image_jobs import (
+    MAX_ATTEMPTS,
+    decode_image,
+    enqueue_image,
+    process_next_job
+)
+from .models import (
+    ImageJob,
+    Ingredient,
+    Recipe,
+    RecipeIngredients,
+    RecipeNeighbour,
+    Subscribe,
+    Tag
+)
+from .serializers import RecipeSerializer
+
+User = get_user_model()
+
+
+class RecipeTestCase(TestCase):
+    """Общие данные тестов: автор, тэг, ингредиент и рецепт."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        self.tag = Tag.objects.create(
+            name='Тестовый тэг', color='#123456', slug='test-tag'
+        )
+        self.ingredient, _ = Ingredient.objects.get_or_create(
+            name='мука', measurement_unit='г'
+        )
+        self.recipe = self.create_recipe('Блины')
+
+    def create_recipe(self, name, author=None):
+        recipe = Recipe.objects.create(
+            author=author or self.author, name=name,
+            text='Описание', cooking_time=10
+        )
+        recipe.tags.add(self.tag)
+        RecipeIngredients.objects.create(
+            recipe=recipe, ingredient=self.ingredient, amount=100
+        )
+        return recipe
+
+
+class RecipeSaveTest(RecipeTestCase):
+
+    def test_update_keeps_concurrent_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=recipe.pk).increment('favorites_count')
+        Recipe.objects.filter(pk=recipe.pk).update(
+            image_status=Recipe.IMAGE_PROCESSING
+        )
+        request = APIRequestFactory().patch('/')
+        request.user = self.author
+        serializer = RecipeSerializer(
+            recipe, data={'name': 'Оладьи'}, partial=True,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Оладьи')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_PROCESSING)
+
+    def test_full_save_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=recipe.pk).increment('cart_count')
+        recipe.text = 'Новое описание'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.text, 'Новое описание')
+        self.assertEqual(recipe.cart_count, 1)
+
+
+class SimilarRecipesTest(RecipeTestCase):
+
+    def test_small_catalogue_gets_neighbours(self):
+        other = self.create_recipe('Оладьи')
+        call_command('similar_recipes', stdout=StringIO())
+        self.assertTrue(RecipeNeighbour.objects.filter(
+            recipe=self.recipe, neighbour=other
+        ).exists())
+        response = APIClient().get(f'/api/recipes/{self.recipe.pk}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data], [other.pk])
+
+    def test_unknown_recipe_is_not_found(self):
+        client = APIClient()
+        for pk in ('abc', 99999):
+            response = client.get(f'/api/recipes/{pk}/similar/')
+            self.assertEqual(response.status_code, 404)
+
+
+def make_image(image_format='PNG', exif=None):
+    buffer = BytesIO()
+    params = {'exif': exif} if exif is not None else {}
+    Image.new('RGB', (40, 30), 'red').save(buffer, image_format, **params)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def make_bomb(width=20000, height=20000):
+    """PNG с заголовком картинки width x height пикселей."""
+    content = bytearray(base64.b64decode(make_image()))
+    header = b'IHDR' + struct.pack('>II', width, height) + content[24:29]
+    content[12:33] = header + struct.pack('>I', zlib.crc32(header))
+    return base64.b64encode(bytes(content)).decode()
+
+
+class DecodeImageTest(SimpleTestCase):
+
+    def test_exif_is_removed(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        exif[0x8825] = {2: (55.0, 45.0, 0.0)}
+        for image_format in ('PNG', 'JPEG', 'WEBP'):
+            with self.subTest(image_format=image_format):
+                content, _ = decode_image(make_image(image_format, exif))
+                image = Image.open(BytesIO(content))
+                self.assertNotIn('exif', image.info)
+                self.assertEqual(len(image.getexif()), 0)
+
+
+class ImageJobTest(RecipeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_job_saves_image(self):
+        enqueue_image(self.recipe, make_image())
+        self.assertIs(process_next_job(), True)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertTrue(self.recipe.image)
+        self.assertFalse(ImageJob.objects.exists())
+
+    def test_broken_image_fails_job(self):
+        enqueue_image(self.recipe, 'not an image')
+        self.assertIs(process_next_job(), False)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertFalse(ImageJob.objects.exists())
+
+    def test_decompression_bomb_fails_job(self):
+        for width in (20000, 7000):
+            with self.subTest(width=width), warnings.catch_warnings():
+                warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+                enqueue_image(self.recipe, make_bomb(width, width))
+                self.assertIs(process_next_job(), False)
+                self.recipe.refresh_from_db()
+                self.assertEqual(
+                    self.recipe.image_status, Recipe.IMAGE_FAILED
+                )
+                self.assertFalse(ImageJob.objects.exists())
+
+    def test_storage_error_is_retried(self):
+        enqueue_image(self.recipe, make_image())
+        with mock.patch(
+            'recipes.image_jobs.create_thumbnails',
+            side_effect=OSError('disk full')
+        ):
+            self.assertIs(process_next_job(), False)
+        job = ImageJob.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.error, 'disk full')
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_PROCESSING)
+        self.assertFalse(self.recipe.image)
+
+    def test_attempts_are_limited(self):
+        enqueue_image(self.recipe, make_image())
+        with mock.patch(
+            'recipes.image_jobs.create_thumbnails',
+            side_effect=OSError('disk full')
+        ):
+            for _ in range(MAX_ATTEMPTS):
+                process_next_job()
+        self.assertFalse(ImageJob.objects.exists())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+
+
+class BulkFavoriteTest(RecipeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def bulk(self, method, ids):
+        return getattr(self.client, method)(
+            '/api/recipes/bulk_favorite/', {'ids': ids}, format='json'
+        )
+
+    def test_counters_follow_changed_rows(self):
+        other = self.create_recipe('Оладьи')
+        response = self.bulk('post', [self.recipe.pk, 99999])
+        self.assertEqual(response.status_code, 200)
+        response = self.bulk('post', [self.recipe.pk, other.pk])
+        self.assertEqual(
+            [item['status'] for item in response.data['results']],
+            ['already_added', 'added']
+        )
+        response = self.bulk('delete', [self.recipe.pk, self.recipe.pk])
+        self.assertEqual(
+            [item['status'] for item in response.data['results']],
+            ['removed']
+        )
+        response = self.bulk('delete', [self.recipe.pk])
+        self.assertEqual(
+            response.data['results'][0]['status'], 'not_added'
+        )
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+        self.assertEqual(other.favorites_count, 1)
+
+    def test_ids_are_validated(self):
+        for ids in ([2 ** 63], [0], [], list(range(1, 102))):
+            with self.subTest(ids=ids[:3]):
+                self.assertEqual(self.bulk('post', ids).status_code, 400)
+
+
+class RecipeIngredientsSignalTest(RecipeTestCase):
+
+    def test_recipe_is_updated_once(self):
+        for name in ('соль', 'сахар', 'молоко'):
+            ingredient, _ = Ingredient.objects.get_or_create(
+                name=name, measurement_unit='г'
+            )
+            RecipeIngredients.objects.create(
+                recipe=self.recipe, ingredient=ingredient, amount=1
+            )
+        updated_at = Recipe.objects.get(pk=self.recipe.pk).updated_at
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                RecipeIngredients.objects.filter(recipe=self.recipe).delete()
+        updates = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "recipes_recipe"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertGreater(
+            Recipe.objects.get(pk=self.recipe.pk).updated_at, updated_at
+        )
+
+
+class PopularEtagTest(RecipeTestCase):
+
+    def test_favorite_changes_popular_etag(self):
+        client = APIClient()
+        url = '/api/recipes/?ordering=popular'
+        etag = client.get(url)['ETag']
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        user = APIClient()
+        user.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = user.post(
+                '/api/recipes/bulk_favorite/', {'ids': [self.recipe.pk]},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotIn('Last-Modified', response)
+
+
+class RecipeQueryCountTest(RecipeTestCase):
+    """
+    Список и рецепт отдаются за фиксированное число запросов:
+    проверка ETag (для списка - наибольшая дата изменения и число
+    рецептов, которое используется и для пагинации), рецепты
+    с автором и отметками пользователя, тэги и ингредиенты.
+    Список по курсору не считает рецепты.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for number in range(5):
+            self.create_recipe(f'Рецепт {number}')
+        self.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+
+    def assert_queries(self, user, url, number):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        cache.clear()
+        with self.assertNumQueries(number):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        for user in (None, self.reader):
+            with self.subTest(user=user):
+                self.assert_queries(user, '/api/recipes/', 4)
+                self.assert_queries(user, '/api/recipes/?limit=2', 4)
+
+    def test_cursor_list(self):
+        for user in (None, self.reader):
+            with self.subTest(user=user):
+                response = self.assert_queries(
+                    user, '/api/recipes/?cursor=&limit=2', 3
+                )
+                self.assert_queries(user, response.data['next'], 3)
+
+    def test_cursor_list_etag(self):
+        client = APIClient()
+        url = '/api/recipes/?cursor='
+        etag = client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_recipe('Новый рецепт')
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail(self):
+        for user in (None, self.reader):
+            with self.subTest(user=user):
+                self.assert_queries(
+                    user, f'/api/recipes/{self.recipe.pk}/', 4
+                )
+
+
+class FeedTest(RecipeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ids = [self.recipe.pk] + [
+            self.create_recipe(f'Рецепт {number}').pk for number in range(5)
+        ]
+        self.ids.reverse()
+        self.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        Subscribe.objects.create(user=self.reader, subscribed=self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def read_feed(self, limit):
+        ids = []
+        url = f'/api/recipes/feed/?limit={limit}'
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.data['results'])
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_last_page_has_no_next(self):
+        for limit in (2, 4, 6, 10):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.read_feed(limit), self.ids)
+
+    def test_deleted_recipes_are_skipped(self):
+        self.assertEqual(self.read_feed(3), self.ids)
+        Recipe.objects.filter(pk__in=self.ids[1:3]).delete()
+        response = self.client.get('/api/recipes/feed/?limit=3')
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.ids[0], *self.ids[3:5]]
+        )
+        self.assertIsNotNone(response.data['next'])
+        ids = [self.ids[0], *self.ids[3:]]
+        self.assertEqual(self.read_feed(3), ids)
+        self.assertEqual(self.read_feed(4), ids)
+
+    def test_feed_continues_past_cached_length(self):
+        with mock.patch('recipes.feed.FEED_LENGTH', 3):
+            self.assertEqual(self.read_feed(2), self.ids)
+
+
+class AuthorChangeTest(RecipeTestCase):
+
+    def test_author_change_updates_etag(self):
+        client = APIClient()
+        url = f'/api/recipes/{self.recipe.pk}/'
+        etag = client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = 'Новое имя'
+            self.author.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['author']['first_name'], 'Новое имя')
+
+    def test_author_change_updates_anonymous_cache(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/recipes/')['X-Cache'], 'MISS')
+        self.assertEqual(client.get('/api/recipes/')['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = 'Новое имя'
+            self.author.save()
+        response = client.get('/api/recipes/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(
+            response.data['results'][0]['author']['first_name'], 'Новое имя'
+        )
@@ -0,0 +1,38 @@
+"""
+Кэш рейтинга популярных рецептов в памяти процесса.
+"""
+from threading import Lock
+
+from .cache import TRENDING, bump_generation, get_generation
+from .models import TrendingRecipe
+
+
+class TrendingCache:
+    """
+    Упорядоченный список id популярных рецептов.
+    Перечитывается из таблицы TrendingRecipe только после
+    пересчета рейтинга, когда меняется поколение в кэше.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._ids = []
+
+    def get_ids(self):
+        version = get_generation(TRENDING)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._ids = list(TrendingRecipe.objects.values_list(
+                        'recipe_id', flat=True
+                    ))
+                    self._version = version
+        return self._ids
+
+    def invalidate(self):
+        """Сбрасывает рейтинг во всех процессах."""
+        bump_generation(TRENDING)
+
+
+trending_cache = TrendingCache()
@@ -1,49 +1,101 @@
 from rest_framework import viewsets
 from rest_framework.response import Response
-from django.http import HttpResponse
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from rest_framework import serializers
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
-from rest_framework import filters
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.decorators import action
-from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import F
-from django.db.models import Sum
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
 from .models import (
+    AuthorCounters,
     Recipe,
     Ingredient,
     Tag,
     FavoriteRecipes,
-    ShoppingList,
-    RecipeIngredients
+    ShoppingList
 )
 from .serializers import (
     IngredientSerializer,
     TagSerializer,
     FavoriteSerializer,
     ShoppingCartSerializer,
+    RecipeIdsSerializer,
     RecipeSerializer,
     RecipeGetSerializer
 )
+from .pagination import RecipeCursorPagination
 from .permissions import OwnerOrReadOnly
+from .cache import (
+    FAVORITES,
+    INGREDIENTS,
+    RECIPES,
+    TAGS,
+    USERS,
+    bump_generation,
+    get_generation,
+    get_generations,
+    user_generation
+)
+from .mixins import AnonymousCacheMixin, ConditionalGetMixin
+from .coverage_index import coverage_index
+from .feed import get_feed_page, schedule_fan_out
+from .ingredients_index import ingredient_index
+from .renderers import CSVRenderer, PlainTextRenderer
+from .search import search_recipes
+from .shopping_list import RENDERERS, get_cart_version, get_purchases
+from .trending import trending_cache
+
+BY_INGREDIENTS_MAX_LIMIT = 100
+FEED_MAX_LIMIT = 100
+SIMILAR_MAX_LIMIT = 100
+
+
+def lock_user(user):
+    """
+    Блокирует строку пользователя до конца транзакции: изменения
+    его избранного и списка покупок выполняются последовательно.
+    """
+    get_user_model().objects.select_for_update().only('pk').get(pk=user.pk)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     Вьюсет, обрабатывающий запросы, поступающие на
     эндпойнты, начинающиеся с api/ingredients.
     Позволяет получить информацию об ингредиентах.
+    Список и поиск по началу названия обслуживаются
+    из индекса ингредиентов в памяти процесса.
     """
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter)
-    search_fields = ('^name',)
     pagination_class = None
 
+    def get_validators(self, request):
+        return get_generation(INGREDIENTS), None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.search, request, *args, **kwargs
+        )
+
+    def search(self, request, *args, **kwargs):
+        name = request.query_params.get(api_settings.SEARCH_PARAM, '')
+        return Response(ingredient_index.search(name))
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(
+    ConditionalGetMixin, AnonymousCacheMixin, viewsets.ReadOnlyModelViewSet
+):
     """
     Вьюсет, обрабатывающий запросы, поступающие на
     эндпойнты, начинающиеся с api/tags.
@@ -52,9 +104,15 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    cache_generations = (TAGS,)
 
+    def get_validators(self, request):
+        return get_generation(TAGS), None
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(
+    ConditionalGetMixin, AnonymousCacheMixin, viewsets.ModelViewSet
+):
     """
     Вьюсет, обрабатывающий запросы, поступающие на
     эндпойнты, начинающиеся с api/recipes.
@@ -62,6 +120,75 @@ class RecipeViewSet(viewsets.ModelViewSet):
     Получение информации о рецептах.
     """
     permission_classes = (OwnerOrReadOnly,)
+    # В рецепты встроены данные автора.
+    cache_generations = (RECIPES, USERS)
+
+    def is_popular(self, request):
+        """Список упорядочен по числу добавлений в избранное."""
+        return (
+            self.action == 'list'
+            and request.query_params.get('ordering') == 'popular'
+        )
+
+    def get_cache_generations(self, request):
+        if self.is_popular(request):
+            return (*self.cache_generations, FAVORITES)
+        return self.cache_generations
+
+    def get_validators(self, request):
+        """
+        ETag рецепта строится по дате его изменения, ETag списка -
+        по наибольшей дате изменения и числу отобранных рецептов,
+        а при порядке по популярности - и по поколению счетчиков
+        избранного. Число рецептов передается пагинатору и повторно
+        не считается. Список по курсору не считает рецепты: его ETag
+        строится только по поколениям данных.
+        Во все ETag входит поколение данных пользователей,
+        так как в рецепты встроены данные автора. Для авторизованного
+        пользователя добавляется поколение его избранного, списка
+        покупок и подписок. Last-Modified отдается только анонимным
+        пользователям и не для порядка по популярности, так как
+        ни отметки пользователей, ни счетчики не меняют дату
+        изменения рецептов.
+        """
+        user = request.user
+        names = [INGREDIENTS, TAGS, USERS]
+        popular = self.is_popular(request)
+        if popular:
+            names.append(FAVORITES)
+        if user.is_authenticated:
+            names.append(user_generation(user.pk))
+        if self.action == 'retrieve':
+            pk = str(self.kwargs['pk'])
+            if not pk.isdigit():
+                return None, None
+            last_modified = Recipe.objects.filter(pk=pk).values_list(
+                'updated_at', flat=True
+            ).first()
+            count = 1
+        elif isinstance(self.paginator, RecipeCursorPagination):
+            names.append(RECIPES)
+            generations = get_generations(names)
+            return '-'.join(str(value) for value in (
+                user.pk or 0, 'cursor',
+                *(generations[name] for name in names)
+            )), None
+        else:
+            stats = self.get_queryset().aggregate(
+                last_modified=Max('updated_at'), count=Count('pk')
+            )
+            last_modified, count = stats['last_modified'], stats['count']
+            self.paginator.object_count = count
+        if last_modified is None:
+            return None, None
+        generations = get_generations(names)
+        etag = '-'.join(str(value) for value in (
+            user.pk or 0, last_modified.timestamp(), count,
+            *(generations[name] for name in names)
+        ))
+        if user.is_authenticated or popular:
+            return etag, None
+        return etag, last_modified
 
     def get_queryset(self):
         tags = self.request.query_params.getlist('tags')
@@ -71,71 +198,284 @@ class RecipeViewSet(viewsets.ModelViewSet):
         is_in_shopping_cart = self.request.query_params.get(
             'is_in_shopping_cart', False
         )
-        qs = Recipe.objects.all()
+        qs = Recipe.objects.select_related('author').with_user_flags(user)
         if tags:
-            recipes = list(
-                Tag.objects.filter(slug__in=tags).values_list(
-                    'recipes', flat=True
-                )
-            )
-            qs = qs.filter(id__in=recipes)
+            qs = qs.filter(Exists(Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__slug__in=tags
+            )))
         if user.is_authenticated:
             if is_favorited:
-                favorite_recipes = list(
-                    FavoriteRecipes.objects.filter(user=user).values_list(
-                        'recipe_id', flat=True
-                    )
-                )
-                qs = qs.filter(id__in=favorite_recipes)
+                qs = qs.filter(is_favorited=True)
             if is_in_shopping_cart:
-                shopping_cart_recipes = list(
-                    ShoppingList.objects.filter(user=user).values_list(
-                        'recipe_id', flat=True))
-                qs = qs.filter(id__in=shopping_cart_recipes)
+                qs = qs.filter(is_in_shopping_cart=True)
         if author is not None:
             qs = qs.filter(author=author)
+        search = self.request.query_params.get('search', '').strip()
+        if search:
+            qs = search_recipes(qs, search)
+        if self.request.query_params.get('ordering') == 'popular':
+            qs = qs.order_by('-favorites_count', '-pub_date')
         return qs
 
     def get_serializer_class(self):
-        if self.action == 'retrieve':
+        if self.request.method in SAFE_METHODS:
             return RecipeGetSerializer
         return RecipeSerializer
 
+    @property
+    def paginator(self):
+        """
+        Список рецептов выдается по курсору, если в запросе
+        передан параметр cursor (в том числе пустой - первая страница).
+        Сортировка по популярности и остальные действия
+        используют обычную постраничную навигацию page/limit.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if (
+                self.action == 'list' and 'cursor' in params
+                and params.get('ordering') != 'popular'
+            ):
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        AuthorCounters.increment(self.request.user.id, 'recipes_count')
+        schedule_fan_out(recipe)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        AuthorCounters.increment(instance.author_id, 'recipes_count', -1)
 
     @action(
         detail=False, methods=['GET'], permission_classes=(IsAuthenticated,)
     )
+    def feed(self, request):
+        """
+        Лента новых рецептов авторов, на которых подписан пользователь.
+        Следующая страница запрашивается по ссылке next (?cursor=<id>),
+        на последней странице next равен null. Лента не ограничена
+        по длине: страницы за пределами FEED_LENGTH рецептов из кэша
+        выбираются из базы данных.
+        """
+        try:
+            cursor = request.query_params.get('cursor')
+            cursor = int(cursor) if cursor else None
+            limit = int(request.query_params.get(
+                'limit', settings.REST_FRAMEWORK['PAGE_SIZE']
+            ))
+        except ValueError:
+            raise serializers.ValidationError({
+                'errors': 'cursor и limit должны быть числами.'
+            })
+        limit = min(max(limit, 1), FEED_MAX_LIMIT)
+        # Лишний рецепт показывает, есть ли следующая страница.
+        page_ids = get_feed_page(request.user.pk, cursor, limit + 1)
+        has_next = len(page_ids) > limit
+        page_ids = page_ids[:limit]
+        recipes = Recipe.objects.select_related('author').with_user_flags(
+            request.user
+        ).in_bulk(page_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in page_ids if pk in recipes], many=True
+        )
+        next_url = None
+        if has_next:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'cursor', page_ids[-1]
+            )
+        return Response({'next': next_url, 'results': serializer.data})
+
+    @action(detail=False, methods=['GET'])
+    def by_ingredients(self, request):
+        """
+        Подбор рецептов по имеющимся ингредиентам (?ingredients=<id>).
+        Рецепты упорядочены по покрытию - доле их ингредиентов,
+        которые есть у пользователя; limit задает число рецептов.
+        """
+        try:
+            ingredient_ids = [
+                int(pk) for pk in request.query_params.getlist('ingredients')
+            ]
+            limit = int(request.query_params.get(
+                'limit', settings.REST_FRAMEWORK['PAGE_SIZE']
+            ))
+        except ValueError:
+            raise serializers.ValidationError({
+                'errors': 'id ингредиентов и limit должны быть числами.'
+            })
+        matches = coverage_index.search(
+            ingredient_ids, min(max(limit, 1), BY_INGREDIENTS_MAX_LIMIT)
+        )
+        recipes = Recipe.objects.select_related('author').with_user_flags(
+            request.user
+        ).in_bulk([match[0] for match in matches])
+        matches = [match for match in matches if match[0] in recipes]
+        serializer = self.get_serializer(
+            [recipes[match[0]] for match in matches], many=True
+        )
+        return Response([
+            dict(data, coverage=round(coverage, 3), matched=matched,
+                 ingredients_count=total)
+            for data, (_, coverage, matched, total) in zip(
+                serializer.data, matches
+            )
+        ])
+
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk=None):
+        """
+        Похожие рецепты, рассчитанные командой similar_recipes,
+        в порядке убывания сходства; limit задает их число.
+        """
+        try:
+            limit = int(request.query_params.get(
+                'limit', settings.REST_FRAMEWORK['PAGE_SIZE']
+            ))
+        except ValueError:
+            raise serializers.ValidationError({
+                'errors': 'limit должен быть числом.'
+            })
+        recipe = self.get_object()
+        recipes = Recipe.objects.select_related('author').with_user_flags(
+            request.user
+        ).filter(similar_to__recipe=recipe).order_by(
+            '-similar_to__score'
+        )[:min(max(limit, 1), SIMILAR_MAX_LIMIT)]
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['GET'])
+    def trending(self, request):
+        """
+        Популярные рецепты: рейтинг по добавлениям в избранное
+        за последний период, рассчитанный командой refresh_trending.
+        """
+        page_ids = self.paginate_queryset(trending_cache.get_ids())
+        recipes = Recipe.objects.select_related('author').with_user_flags(
+            request.user
+        ).in_bulk(page_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in page_ids if pk in recipes], many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False, methods=['GET'], permission_classes=(IsAuthenticated,),
+        renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer)
+    )
     def download_shopping_cart(self, request):
         """
         Метод позволяет выгружать список ингредиентов
         с подсчетом итогового количества для рецептов,
         добавленных в список для покупок.
-        Выгрузка реализована в txt-файл.
+        Формат выгрузки задается параметром format: txt (по умолчанию),
+        csv или json. Список отдается потоком, повторная выгрузка
+        неизмененного списка отвечает 304 Not Modified.
         """
-        purchases = RecipeIngredients.objects.select_related(
-            'recipe', 'ingredient'
+        file_format = request.accepted_renderer.format
+        etag = quote_etag(
+            f'{file_format}-{get_cart_version(request.user)}'
         )
-        purchases = purchases.filter(
-            recipe__shoppingcart__user=request.user
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        response = StreamingHttpResponse(
+            RENDERERS[file_format](get_purchases(request.user)),
+            content_type=(
+                f'{request.accepted_renderer.media_type}; charset=utf-8'
+            )
         )
-        purchases = purchases.values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).order_by().values("ingredient__name").annotate(
-            name=F('ingredient__name'),
-            units=F('ingredient__measurement_unit'),
-            total_amt=Sum('amount')
+        response['Content-Disposition'] = (
+            f'attachment; filename=shopping_list.{file_format}'
         )
-        text = '\n'.join([
-            f"{item['name']} {item['units']} - {item['total_amt']}"
-            for item in purchases
-        ])
-        filename = 'shopping_list'
-        response = HttpResponse(text, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
+        response['ETag'] = etag
         return response
 
+    def apply_bulk(self, request, model, counter, generation=None):
+        """
+        Добавляет (POST) или удаляет (DELETE) рецепты с id из списка ids
+        в избранном или списке покупок пользователя за несколько
+        запросов к базе данных независимо от длины списка.
+        Изменения пользователя выполняются под блокировкой его строки,
+        поэтому счетчики меняются только для действительно
+        добавленных и удаленных записей; generation - поколение,
+        увеличиваемое вместе со счетчиком.
+        Возвращает результат для каждого id.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        recipes = Recipe.objects.only('pk').in_bulk(ids)
+        with transaction.atomic():
+            lock_user(request.user)
+            present = set(model.objects.select_for_update().filter(
+                user=request.user, recipe_id__in=ids
+            ).values_list('recipe_id', flat=True))
+            if request.method == 'POST':
+                changed = [
+                    pk for pk in ids if pk in recipes and pk not in present
+                ]
+                model.objects.bulk_create(
+                    [model(user=request.user, recipe_id=pk)
+                     for pk in changed],
+                    ignore_conflicts=True
+                )
+                skipped, done, delta = 'already_added', 'added', 1
+            else:
+                changed = [pk for pk in ids if pk in present]
+                model.objects.filter(
+                    user=request.user, recipe_id__in=changed
+                ).delete()
+                skipped, done, delta = 'not_added', 'removed', -1
+            if changed:
+                Recipe.objects.filter(pk__in=changed).increment(
+                    counter, delta
+                )
+                bump_generation(user_generation(request.user.pk))
+                if generation is not None:
+                    bump_generation(generation)
+        changed = set(changed)
+        return Response({'results': [
+            {
+                'id': pk,
+                'status': (
+                    done if pk in changed
+                    else skipped if pk in recipes else 'not_found'
+                )
+            }
+            for pk in ids
+        ]})
+
+    @action(
+        detail=False, methods=['POST', 'DELETE'],
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_shopping_cart(self, request):
+        """
+        Массовое добавление и удаление рецептов
+        в списке для покупок: {"ids": [1, 2, 3]}.
+        """
+        return self.apply_bulk(request, ShoppingList, 'cart_count')
+
+    @action(
+        detail=False, methods=['POST', 'DELETE'],
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_favorite(self, request):
+        """
+        Массовое добавление и удаление рецептов
+        в избранном: {"ids": [1, 2, 3]}.
+        """
+        return self.apply_bulk(
+            request, FavoriteRecipes, 'favorites_count', FAVORITES
+        )
+
     @action(
         detail=True, methods=['POST', 'DELETE'],
         permission_classes=(IsAuthenticated,)
@@ -152,7 +492,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 })
             if serializer.is_valid():
                 recipe = Recipe.objects.get(id=kwargs["pk"])
-                serializer.save(user=request.user, recipe=recipe)
+                with transaction.atomic():
+                    lock_user(request.user)
+                    serializer.save(user=request.user, recipe=recipe)
+                    Recipe.objects.filter(pk=recipe.pk).increment(
+                        'cart_count'
+                    )
+                    bump_generation(user_generation(request.user.pk))
                 return Response(
                     serializer.data, status=status.HTTP_201_CREATED
                 )
@@ -168,7 +514,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 raise serializers.ValidationError({
                     'errors': 'Рецепт не существует или отсутствует в корзине'
                 })
-            shopping_recipe.delete()
+            with transaction.atomic():
+                lock_user(request.user)
+                deleted, _ = shopping_recipe.delete()
+                if deleted:
+                    Recipe.objects.filter(pk=kwargs["pk"]).increment(
+                        'cart_count', -1
+                    )
+                    bump_generation(user_generation(request.user.pk))
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -186,7 +539,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
             if serializer.is_valid():
                 recipe = Recipe.objects.get(id=kwargs["pk"])
-                serializer.save(user=request.user, recipe=recipe)
+                with transaction.atomic():
+                    lock_user(request.user)
+                    serializer.save(user=request.user, recipe=recipe)
+                    Recipe.objects.filter(pk=recipe.pk).increment(
+                        'favorites_count'
+                    )
+                    bump_generation(user_generation(request.user.pk))
+                    bump_generation(FAVORITES)
                 return Response(
                     serializer.data, status=status.HTTP_201_CREATED
                 )
@@ -203,5 +563,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     'errors': 'Рецепт не существует или '
                     + 'отсутствует в избранном'
                 })
-            favorite_recipe.delete()
+            with transaction.atomic():
+                lock_user(request.user)
+                deleted, _ = favorite_recipe.delete()
+                if deleted:
+                    Recipe.objects.filter(pk=kwargs["pk"]).increment(
+                        'favorites_count', -1
+                    )
+                    bump_generation(user_generation(request.user.pk))
+                    bump_generation(FAVORITES)
             return Response(status=status.HTTP_204_NO_CONTENT)
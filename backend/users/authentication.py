@@ -0,0 +1,121 @@
+"""
+Аутентификация по токену с кэшированием пары токен - пользователь.
+Найденные пользователи хранятся в ограниченном LRU-кэше процесса
+(и, по настройке, в общем кэше), поэтому запрос к таблицам
+Token и User выполняется только при промахе.
+Записи проверяются по поколению токена в общем кэше: выход
+из системы и смена пароля сбрасывают их сразу.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from recipes.cache import bump_generation, peek_generation
+
+TOKEN_KEY = 'auth_token:{}'
+# Поколение токена должно жить дольше записей кэша: после его
+# истечения поколение снова считается нулевым, и записи, сохраненные
+# до первого сброса, не должны оставаться действительными.
+GENERATION_TIMEOUT = max(
+    60 * 60 * 24, 2 * settings.AUTH_TOKEN_CACHE['TIMEOUT']
+)
+
+
+def token_generation(key):
+    """Имя поколения записи кэша для токена key."""
+    return f'token:{key}'
+
+
+class LocalTokenCache:
+    """
+    LRU-кэш процесса с ограниченным размером и временем жизни записей.
+    Запись хранит поколение, с которым она была сохранена.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self._lock = Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Возвращает пару (поколение, значение) или None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, generation, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return generation, value
+
+    def set(self, key, generation, value):
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic() + self.timeout, generation, value
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+token_cache = LocalTokenCache(
+    settings.AUTH_TOKEN_CACHE['SIZE'], settings.AUTH_TOKEN_CACHE['TIMEOUT']
+)
+
+
+def invalidate_token(key):
+    """Сбрасывает кэшированного пользователя токена во всех процессах."""
+    token_cache.delete(key)
+    bump_generation(token_generation(key), GENERATION_TIMEOUT)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, обращающийся к базе данных
+    только при отсутствии токена в кэше.
+    Поколение токена никогда не создается при чтении, поэтому
+    запросы с несуществующими токенами не добавляют ключей в кэш.
+    """
+
+    def get_cached(self, key):
+        entry = token_cache.get(key)
+        local = entry is not None
+        if not local and settings.AUTH_TOKEN_CACHE['SHARED']:
+            entry = cache.get(TOKEN_KEY.format(key))
+        if entry is None:
+            return None
+        generation, credentials = entry
+        if generation != peek_generation(token_generation(key)):
+            token_cache.delete(key)
+            return None
+        if not local:
+            token_cache.set(key, generation, credentials)
+        return credentials
+
+    def authenticate_credentials(self, key):
+        credentials = self.get_cached(key)
+        if credentials is not None:
+            return credentials
+        # Поколение читается до запроса к базе данных: если выход
+        # из системы зафиксирован между ними, запись сохранится
+        # под старым поколением и будет отброшена при чтении.
+        generation = peek_generation(token_generation(key))
+        credentials = super().authenticate_credentials(key)
+        token_cache.set(key, generation, credentials)
+        if settings.AUTH_TOKEN_CACHE['SHARED']:
+            cache.set(
+                TOKEN_KEY.format(key), (generation, credentials),
+                settings.AUTH_TOKEN_CACHE['TIMEOUT']
+            )
+        return credentials
@@ -3,7 +3,9 @@ from django.contrib.auth import get_user_model
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField
+from recipes.fields import ThumbnailField
 from recipes.models import (
+    AuthorCounters,
     Subscribe,
     Recipe
 )
@@ -60,11 +62,14 @@ class RecipeSmallSerializer(serializers.ModelSerializer):
     """
 
     image = Base64ImageField()
+    image_thumb = ThumbnailField()
+    image_srcset = ThumbnailField(srcset=True)
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'name', 'image', 'cooking_time',
+            'id', 'name', 'image', 'image_thumb', 'image_srcset',
+            'cooking_time',
         )
 
 
@@ -73,13 +78,13 @@ class SubscribeSerializer(serializers.ModelSerializer):
     Сериализатор создания и удаления подписок пользователя.
     """
 
-    email = serializers.SerializerMethodField()
+    email = serializers.ReadOnlyField(source='subscribed.email')
     id = serializers.PrimaryKeyRelatedField(
         source='subscribed_id', read_only=True
     )
-    username = serializers.SerializerMethodField()
-    first_name = serializers.SerializerMethodField()
-    last_name = serializers.SerializerMethodField()
+    username = serializers.ReadOnlyField(source='subscribed.username')
+    first_name = serializers.ReadOnlyField(source='subscribed.first_name')
+    last_name = serializers.ReadOnlyField(source='subscribed.last_name')
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
@@ -92,6 +97,10 @@ class SubscribeSerializer(serializers.ModelSerializer):
         )
 
     def get_recipes(self, obj):
+        if hasattr(obj.subscribed, 'recipes_preview'):
+            return RecipeSmallSerializer(
+                obj.subscribed.recipes_preview, many=True
+            ).data
         if self.context.get('request').query_params.get('recipes_limit'):
             recipes_limit = int(
                 self.context.get('request').query_params.get('recipes_limit')
@@ -105,20 +114,11 @@ class SubscribeSerializer(serializers.ModelSerializer):
             )
         return RecipeSmallSerializer(recipes, many=True).data
 
-    def get_email(self, obj):
-        return obj.subscribed.email
-
-    def get_username(self, obj):
-        return obj.subscribed.username
-
-    def get_first_name(self, obj):
-        return obj.subscribed.first_name
-
-    def get_last_name(self, obj):
-        return obj.subscribed.last_name
-
     def get_is_subscribed(self, obj):
         return True
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.subscribed).count()
+        try:
+            return obj.subscribed.counters.recipes_count
+        except AuthorCounters.DoesNotExist:
+            return 0
@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.cache import USERS, bump_generation
+from .authentication import invalidate_token
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Сбрасывает кэш аутентификации при выходе из системы."""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, update_fields, **kwargs):
+    """
+    Сбрасывает кэш аутентификации по всем токенам пользователя
+    при изменении его данных (смена пароля, блокировка).
+    Обновление одной даты входа кэш не затрагивает.
+    """
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ):
+        invalidate_token(key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_authors(sender, instance, created, update_fields, **kwargs):
+    """
+    Сбрасывает ETag ответов с рецептами, в которые встроены
+    данные автора. Новые пользователи и обновление даты входа
+    эти ответы не меняют.
+    """
+    if created or (
+        update_fields is not None and set(update_fields) <= {'last_login'}
+    ):
+        return
+    bump_generation(USERS)
@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.cache import GENERATION_KEY, _bump_generation
+from .authentication import (
+    CachedTokenAuthentication,
+    token_cache,
+    token_generation
+)
+
+User = get_user_model()
+
+
+class CachedTokenAuthenticationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='pass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def tearDown(self):
+        token_cache.delete(self.token.key)
+
+    def test_cached_token_skips_database(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        # Остается только запрос is_subscribed сериализатора пользователя.
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout_invalidates_token(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_user_change_invalidates_token(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.user.set_password('new-pass')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_unknown_tokens_do_not_create_cache_keys(self):
+        client = APIClient()
+        for number in range(5):
+            client.credentials(HTTP_AUTHORIZATION=f'Token bogus{number}')
+            self.assertEqual(client.get('/api/users/me/').status_code, 401)
+            self.assertIsNone(cache.get(
+                GENERATION_KEY.format(token_generation(f'bogus{number}'))
+            ))
+
+    def test_logout_during_lookup_is_not_lost(self):
+        lookup = TokenAuthentication.authenticate_credentials
+
+        def lookup_then_logout(authentication, key):
+            credentials = lookup(authentication, key)
+            # Другой процесс фиксирует выход из системы сразу
+            # после чтения токена из базы данных.
+            _bump_generation(token_generation(key))
+            return credentials
+
+        with mock.patch.object(
+            TokenAuthentication, 'authenticate_credentials',
+            lookup_then_logout
+        ):
+            self.assertEqual(
+                self.client.get('/api/users/me/').status_code, 200
+            )
+        self.assertIsNone(
+            CachedTokenAuthentication().get_cached(self.token.key)
+        )
@@ -4,9 +4,13 @@ from rest_framework import serializers
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import OuterRef, Prefetch, Subquery
 from recipes.pagination import LimitPagination
 
-from recipes.models import Subscribe
+from recipes.cache import bump_generation, user_generation
+from recipes.feed import invalidate_feed
+from recipes.models import AuthorCounters, Recipe, Subscribe
 from .serializers import SubscribeSerializer
 
 User = get_user_model()
@@ -42,7 +46,11 @@ class SubscribeView(APIView):
                 raise serializers.ValidationError({
                     'errors': 'Нельзя подписываться на себя.'
                 })
-            serializer.save(user=request.user, subscribed=subscribed)
+            with transaction.atomic():
+                serializer.save(user=request.user, subscribed=subscribed)
+                AuthorCounters.increment(subscribed.id, 'followers_count')
+                bump_generation(user_generation(request.user.pk))
+                invalidate_feed(request.user.pk)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, *args, **kwargs):
@@ -54,7 +62,13 @@ class SubscribeView(APIView):
             raise serializers.ValidationError({
                 'errors': 'Вы не подписаны на пользователя'
             })
-        subscribe.delete()
+        with transaction.atomic():
+            subscribe.delete()
+            AuthorCounters.increment(
+                subscribe.subscribed_id, 'followers_count', -1
+            )
+            bump_generation(user_generation(request.user.pk))
+            invalidate_feed(request.user.pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -65,8 +79,32 @@ class SubscriptionsView(APIView, LimitPagination):
 
     permission_classes = (IsAuthenticated,)
 
+    def get_recipes_preview(self, request):
+        """
+        Рецепты авторов для превью подписок. При заданном recipes_limit
+        для всех авторов страницы одним запросом выбираются только
+        последние recipes_limit рецептов каждого автора.
+        """
+        recipes = Recipe.objects.all()
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('pk')[:int(recipes_limit)]
+            ))
+        return recipes
+
     def get(self, request, *args, **kwargs):
-        subscribes = Subscribe.objects.filter(user=request.user)
+        subscribes = Subscribe.objects.filter(
+            user=request.user
+        ).select_related(
+            'subscribed', 'subscribed__counters'
+        ).prefetch_related(Prefetch(
+            'subscribed__recipes',
+            queryset=self.get_recipes_preview(request),
+            to_attr='recipes_preview'
+        )).order_by('pk')
 
         result_page = self.paginate_queryset(subscribes, request, view=self)
         serializer = SubscribeSerializer(